@@ -9,31 +9,166 @@ Created on Sun Nov  9 22:52:40 2025
 # Dependencies
 # =============================================================================
 
+import time
+_STARTUP_T0 = time.perf_counter()
 import sys
 import json
 import os
-import time
+import re
+import importlib
+import asyncio
+import subprocess
+import threading
+import hashlib
+import shutil
+import functools
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from PyQt5.QtGui import QFont, QPixmap
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton,
     QFileDialog, QTextEdit, QHBoxLayout, QFrame, QCheckBox, QGridLayout,
     QComboBox
 )
-from PyQt5.QtCore import Qt
-import numpy as np
-import yaml
-import paramiko
-from scp import SCPClient
-from tqdm import tqdm
+from PyQt5.QtCore import Qt, QObject, pyqtSignal
 import glob
-import pandas as pd
-from astropy.io import fits
+
+
+class _LazyModule:
+    """Stands in for a module and imports it on first attribute access.
+
+    numpy, pandas, astropy, yaml and the SSH stack together take seconds to
+    import from a network-mounted environment, and most sessions only need
+    some of them, so none is imported before the window is up.
+    """
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        if self.__dict__["_module"] is None:
+            self.__dict__["_module"] = importlib.import_module(self.__dict__["_name"])
+        return self.__dict__["_module"]
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    @property
+    def loaded(self):
+        return self.__dict__["_module"] is not None
+
+
+def _lazy_callable(module, name):
+    """A from-import of a class or function that is resolved on first call."""
+    lazy = _LazyModule(module)
+
+    def call(*args, **kwargs):
+        return getattr(lazy, name)(*args, **kwargs)
+    call.lazy_module = lazy
+    return call
+
+
+np = _LazyModule("numpy")
+yaml = _LazyModule("yaml")
+paramiko = _LazyModule("paramiko")
+SCPClient = _lazy_callable("scp", "SCPClient")
+tqdm = _lazy_callable("tqdm", "tqdm")
+pd = _LazyModule("pandas")
+fits = _LazyModule("astropy.io.fits")
+WCS = _lazy_callable("astropy.wcs", "WCS")
+
+# =============================================================================
+# Tracing
+# Nested timing spans around the local stages of a Generate click: settings,
+# FITS reads, bin computation, rendering, file writes, SSH and submission.
+# Spans carry a category so a slow click can be read as I/O, network or
+# computation; the trace exports in the Chrome trace-event format, which
+# chrome://tracing and Perfetto open directly.
+# =============================================================================
+
+class Tracer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.spans = []
+            self._t0 = time.perf_counter()
+
+    @contextmanager
+    def span(self, name, cat="compute", **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.spans.append({"name": name, "cat": cat, "start": start - self._t0,
+                                   "dur": end - start, "tid": threading.get_ident(),
+                                   "args": {k: str(v) for k, v in args.items()}})
+
+    def export(self, path):
+        """Writes the spans as Chrome trace-event JSON."""
+        with self._lock:
+            events = [{"name": sp["name"], "cat": sp["cat"], "ph": "X",
+                       "ts": round(sp["start"] * 1e6), "dur": round(sp["dur"] * 1e6),
+                       "pid": os.getpid(), "tid": sp["tid"], "args": sp["args"]}
+                      for sp in self.spans]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
+
+    def summary(self, top=5):
+        """Status lines: self time per category and the slowest span names.
+
+        Self time excludes nested spans on the same thread, so the categories
+        add up to the traced wall time.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda sp: (sp["tid"], sp["start"], -sp["dur"]))
+        self_time = [sp["dur"] for sp in spans]
+        stack = []
+        for i, sp in enumerate(spans):
+            while stack and (spans[stack[-1]]["tid"] != sp["tid"] or
+                             spans[stack[-1]]["start"] + spans[stack[-1]]["dur"] <= sp["start"]):
+                stack.pop()
+            if stack:
+                self_time[stack[-1]] -= sp["dur"]
+            stack.append(i)
+        by_cat, by_name = {}, {}
+        for sp, own in zip(spans, self_time):
+            by_cat[sp["cat"]] = by_cat.get(sp["cat"], 0.0) + own
+            count, total = by_name.get(sp["name"], (0, 0.0))
+            by_name[sp["name"]] = (count + 1, total + sp["dur"])
+        lines = ["Timing by category: " + ", ".join(
+            f"{cat} {1000 * t:.0f} ms" for cat, t in sorted(by_cat.items(), key=lambda kv: -kv[1]))]
+        for name, (count, total) in sorted(by_name.items(), key=lambda kv: -kv[1][1])[:top]:
+            lines.append(f"  {name}: {1000 * total:.0f} ms" + (f" ({count}×)" if count > 1 else ""))
+        return lines
+
+
+TRACER = Tracer()
+
+
+def traced(name, cat="compute"):
+    """Decorator recording every call of a function as a span."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with TRACER.span(name, cat):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
 
 # =============================================================================
 # If there is a problem with setting up FermiPhased with your cluster, it will
 # be located somewhere here
 # =============================================================================
 
+@traced("ssh_connect", "network")
 def create_ssh_client(hostname, username, key_filename):
     """Creates and returns an SSH client connection using key authentication."""
     ssh = paramiko.SSHClient()
@@ -43,8 +178,14 @@ def create_ssh_client(hostname, username, key_filename):
         key_filename))
     return ssh
 
-def scp_transfer(LOCAL_PATH, REMOTE_PATH,config):
-    """Transfers scripts to the remote server with a progress bar."""
+def scp_transfer(LOCAL_PATH, REMOTE_PATH,config, keep_flags=False):
+    """Transfers scripts to the remote server with a progress bar.
+
+    Returns the list of SLURM job IDs reported by sbatch so the submitted
+    batches can be followed with a JobMonitor. keep_flags leaves the
+    done_<phase>.flag of finished phases in place for a resubmission.
+    """
+    job_ids = []
     ssh = None
     scp = None
     SSH_HOST = config["ssh"]["host"]
@@ -55,12 +196,16 @@ def scp_transfer(LOCAL_PATH, REMOTE_PATH,config):
         ssh.get_transport().set_keepalive(30)
         scp = SCPClient(ssh.get_transport())
         print("trying...")
-        clean_cmd = f'find {REMOTE_PATH} -maxdepth 1 -type f -name "*.sh" -delete'
-        ssh.exec_command(clean_cmd)
-        print("-------- Old shell scripts deleted --------")
-        flag_cmd = f'find {REMOTE_PATH} -maxdepth 1 -type f -name "done*" -delete'
-        ssh.exec_command(flag_cmd)
-        print("-------- Old flags  deleted --------")
+        with TRACER.span("remote_cleanup", "network"):
+            clean_cmd = f'find {REMOTE_PATH} -maxdepth 1 -type f -name "*.sh" -delete'
+            ssh.exec_command(clean_cmd)[1].channel.recv_exit_status()
+            print("-------- Old shell scripts deleted --------")
+            flag_cmd = (f'find {REMOTE_PATH} -maxdepth 1 -type f '
+                        f'\\( -name "failed_*.flag" -o -name "analysis_job.id" \\) -delete')
+            if not keep_flags:
+                flag_cmd += f'; find {REMOTE_PATH} -maxdepth 1 -type f -name "done*" -delete'
+            ssh.exec_command(flag_cmd)[1].channel.recv_exit_status()
+            print("-------- Old flags  deleted --------")
         files_to_transfer = [
             f for f in os.listdir(LOCAL_PATH)
             if f.endswith(".sh") or f.endswith(".yaml") or f == "analyze_phases.py"
@@ -68,16 +213,17 @@ def scp_transfer(LOCAL_PATH, REMOTE_PATH,config):
 
         if not files_to_transfer:
             print("No scripts found to transfer.")
-            return
+            return job_ids
 
         print(f"Uploading {len(files_to_transfer)} files → {REMOTE_PATH}\n")
 
         with tqdm(total=len(files_to_transfer), unit="file") as pbar:
             for file in files_to_transfer:
-                scp.put(
-                    os.path.join(LOCAL_PATH, file),
-                    os.path.join(REMOTE_PATH, file),
-                )
+                with TRACER.span("upload", "network", file=file):
+                    scp.put(
+                        os.path.join(LOCAL_PATH, file),
+                        os.path.join(REMOTE_PATH, file),
+                    )
                 pbar.set_postfix_str(f"Uploading: {file}")
                 pbar.update(1)
         scp.close()
@@ -94,16 +240,593 @@ def scp_transfer(LOCAL_PATH, REMOTE_PATH,config):
         done
         "'''
 
-        stdin, stdout, stderr = ssh.exec_command(cmd)
+        with TRACER.span("submit", "network"):
+            stdin, stdout, stderr = ssh.exec_command(cmd)
 
-        # wait for completion and print output
-        stdout.channel.recv_exit_status()
-        # print(stdout.read().decode())
+            # wait for completion and print output
+            stdout.channel.recv_exit_status()
+            job_ids = parse_job_ids(stdout.read().decode())
         # print(stderr.read().decode())
 
-        print("-------- SBATCHs Submitted --------")
+        print(f"-------- SBATCHs Submitted ({len(job_ids)} jobs) --------")
     except Exception as e:
         print(f"SCP Upload Error: {e}")
+    return job_ids
+
+
+# =============================================================================
+# Run manifests
+# Instead of one script per batch, the workstation uploads manifest.json (the
+# resolved settings, setup.yaml paths, a placeholder batch script and the
+# shared config/analysis files) plus a stdlib-only expander that renders the
+# batch scripts next to it on the cluster and submits them.
+# =============================================================================
+
+MANIFEST_VERSION = 1
+MANIFEST_PLACEHOLDERS = ("@FP_PHASE@", "@FP_BATCH@", "@FP_PHASE_QUEUE@")
+
+MANIFEST_EXPANDER = """#!/usr/bin/env python3
+# Renders a FermiPhased run manifest into phase_batch_<k>.sh and submits them.
+# Usage: python3 fp_expand.py manifest.json [--no-submit]
+import glob
+import json
+import os
+import subprocess
+import sys
+
+PLACEHOLDERS = %r
+
+
+def expand(manifest_path, submit=True):
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    run_dir = os.path.dirname(os.path.abspath(manifest_path))
+    for old in glob.glob(os.path.join(run_dir, "phase_batch_*.sh")) + glob.glob(os.path.join(run_dir, "done*")) + \
+            glob.glob(os.path.join(run_dir, "failed_*.flag")) + \
+            glob.glob(os.path.join(run_dir, "analysis_job.id")):
+        os.remove(old)
+    for name, text in manifest["files"].items():
+        with open(os.path.join(run_dir, name), "w") as f:
+            f.write(text)
+    for batch in manifest["batches"]:
+        values = (str(batch["phase"]), str(batch["batch"]), " ".join(str(p) for p in batch["phases"]))
+        script = manifest["batch_template"]
+        for placeholder, value in zip(PLACEHOLDERS, values):
+            script = script.replace(placeholder, value)
+        path = os.path.join(run_dir, "phase_batch_%%d.sh" %% batch["batch"])
+        with open(path, "w") as f:
+            f.write(script)
+        if submit:
+            result = subprocess.run(["sbatch", path], cwd=run_dir, capture_output=True, text=True)
+            sys.stdout.write(result.stdout)
+            sys.stderr.write(result.stderr)
+
+
+if __name__ == "__main__":
+    expand(sys.argv[1], submit="--no-submit" not in sys.argv[2:])
+""" % (MANIFEST_PLACEHOLDERS,)
+
+
+def manifest_transfer(LOCAL_PATH, REMOTE_PATH, config):
+    """Uploads manifest.json and fp_expand.py, expands and submits on the cluster.
+
+    Two files and one command regardless of the number of phase bins.
+    Returns the submitted SLURM job IDs.
+    """
+    job_ids = []
+    ssh = None
+    try:
+        ssh = create_ssh_client(config["ssh"]["host"], config["ssh"]["username"],
+                                config["ssh"]["key_path"])
+        sftp = ssh.open_sftp()
+        for name in ("manifest.json", "fp_expand.py"):
+            with TRACER.span("upload", "network", file=name):
+                sftp.put(os.path.join(LOCAL_PATH, name), f"{REMOTE_PATH}/{name}")
+        sftp.close()
+        print("-------- Manifest uploaded --------")
+        with TRACER.span("submit", "network"):
+            stdin, stdout, stderr = ssh.exec_command(
+                f'bash -l -c "cd {REMOTE_PATH} && python3 fp_expand.py manifest.json"')
+            stdout.channel.recv_exit_status()
+            job_ids = parse_job_ids(stdout.read().decode())
+        print(f"-------- SBATCHs Submitted ({len(job_ids)} jobs) --------")
+    except Exception as e:
+        print(f"Manifest Upload Error: {e}")
+    finally:
+        if ssh is not None:
+            ssh.close()
+    return job_ids
+
+
+def submit_sed_followup(REMOTE_PATH, config):
+    """Submits the deferred-SED job built from the run's analyze_script.sh."""
+    ssh = None
+    try:
+        ssh = create_ssh_client(config["ssh"]["host"], config["ssh"]["username"],
+                                config["ssh"]["key_path"])
+        cmd = f"""bash -l -c "
+        cd {REMOTE_PATH} || exit 1
+        [ -f analyze_script.sh ] || exit 1
+        sed 's/^python analyze_phases.py.*/python analyze_phases.py --sed-only/' analyze_script.sh > sed_script.sh
+        sbatch sed_script.sh
+        " """
+        stdin, stdout, stderr = ssh.exec_command(cmd)
+        stdout.channel.recv_exit_status()
+        return parse_job_ids(stdout.read().decode())
+    except Exception as e:
+        print(f"SED Submit Error: {e}")
+        return []
+    finally:
+        if ssh is not None:
+            ssh.close()
+
+
+def parse_job_ids(sbatch_output):
+    """Pulls the job IDs out of 'Submitted batch job <id>' lines."""
+    return re.findall(r"Submitted batch job (\d+)", sbatch_output)
+
+# =============================================================================
+# Result harvesting
+# Pulls only the per-phase and run-level result artifacts back to the
+# workstation. Several SFTP channels share one SSH connection; partial
+# downloads resume from their .part file when it was cut from the same remote
+# version, every download is checked against the remote size and MD5, and
+# finished files are skipped when size and MD5 already match.
+# =============================================================================
+
+RESULT_PATTERNS = ["*_sed.csv", "spectral_pars.npy", "fluxes.csv", "fluxes_band_*.csv",
+                   "*_phase_folded_lc.png",
+                   "*_results.npz", "metrics.jsonl", "disk.json"]
+HARVEST_CHUNK = 1024 * 1024
+
+
+def list_remote_results(ssh, REMOTE_PATH, patterns=RESULT_PATTERNS):
+    """Lists result files in the run directory and its numeric phase dirs."""
+    names = " -o ".join(f"-name '{p}'" for p in patterns)
+    cmd = f"cd {REMOTE_PATH} && find . -maxdepth 2 -type f \\( {names} \\) -printf '%P\\t%s\\n'"
+    stdin, stdout, stderr = ssh.exec_command(cmd)
+    results = {}
+    for line in stdout.read().decode().splitlines():
+        path, _, size = line.partition("\t")
+        top = path.split("/")[0]
+        # Only the run directory itself and phase bins, never scratch subdirs
+        if "/" in path and not top.isdigit():
+            continue
+        results[path] = int(size)
+    return results
+
+
+def remote_md5(ssh, REMOTE_PATH, paths):
+    """MD5 sums for several remote files in one round trip."""
+    if not paths:
+        return {}
+    quoted = " ".join(f"'{p}'" for p in paths)
+    stdin, stdout, stderr = ssh.exec_command(f"cd {REMOTE_PATH} && md5sum {quoted}")
+    sums = {}
+    for line in stdout.read().decode().splitlines():
+        digest, _, path = line.partition("  ")
+        sums[path.strip()] = digest
+    return sums
+
+
+def local_md5(path):
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HARVEST_CHUNK), b""):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def download_resumable(transport, remote_file, local_file, size, md5=None):
+    """Fetches one file on its own SFTP channel, resuming a partial .part.
+
+    The .part carries the mtime of the remote file it was cut from, so a
+    partial copy of another version is dropped rather than resumed. The
+    download must match the remote size, and md5 when given, before it
+    replaces local_file.
+    """
+    part = local_file + ".part"
+    os.makedirs(os.path.dirname(local_file) or ".", exist_ok=True)
+    sftp = paramiko.SFTPClient.from_transport(transport)
+    try:
+        attrs = sftp.stat(remote_file)
+        size, mtime = attrs.st_size, attrs.st_mtime
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if offset and (offset > size or int(os.path.getmtime(part)) != mtime):
+            os.remove(part)
+            offset = 0
+        try:
+            with sftp.open(remote_file, "rb") as rf, open(part, "ab") as lf:
+                rf.seek(offset)
+                rf.prefetch(size)
+                while True:
+                    chunk = rf.read(HARVEST_CHUNK)
+                    if not chunk:
+                        break
+                    lf.write(chunk)
+        finally:
+            # Also stamps an interrupted .part, so the next harvest can resume it
+            if os.path.exists(part):
+                os.utime(part, (mtime, mtime))
+    finally:
+        sftp.close()
+    got = os.path.getsize(part)
+    if got != size or (md5 and local_md5(part) != md5):
+        os.remove(part)
+        raise IOError(f"{remote_file} failed its size/MD5 check after download "
+                      f"({got} of {size} bytes); it will be fetched again next harvest")
+    os.replace(part, local_file)
+    return local_file
+
+
+def harvest_results(LOCAL_PATH, REMOTE_PATH, config, workers=None):
+    """Downloads phase results from the cluster. Returns the fetched paths."""
+    fetched = []
+    ssh = None
+    workers = workers or config.get("harvest", {}).get("workers", 4)
+    try:
+        ssh = create_ssh_client(config["ssh"]["host"], config["ssh"]["username"],
+                                config["ssh"]["key_path"])
+        transport = ssh.get_transport()
+        transport.set_keepalive(30)
+
+        remote = list_remote_results(ssh, REMOTE_PATH)
+        same_size = [p for p, size in remote.items()
+                     if os.path.exists(os.path.join(LOCAL_PATH, p))
+                     and os.path.getsize(os.path.join(LOCAL_PATH, p)) == size]
+        sums = remote_md5(ssh, REMOTE_PATH, same_size)
+        up_to_date = {p for p in same_size
+                      if sums.get(p) == local_md5(os.path.join(LOCAL_PATH, p))}
+        todo = {p: size for p, size in remote.items() if p not in up_to_date}
+        # Checked against each download before it replaces the local file
+        todo_sums = remote_md5(ssh, REMOTE_PATH, list(todo))
+
+        print(f"Harvesting {len(todo)} files ({len(up_to_date)} already current) → {LOCAL_PATH}\n")
+        with tqdm(total=len(todo), unit="file") as pbar, \
+                ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(download_resumable, transport,
+                            f"{REMOTE_PATH}/{p}", os.path.join(LOCAL_PATH, p), size, todo_sums.get(p)): p
+                for p, size in todo.items()
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    fetched.append(future.result())
+                except Exception as e:
+                    print(f"Harvest Error ({path}): {e}")
+                pbar.set_postfix_str(f"Downloaded: {path}")
+                pbar.update(1)
+        print("-------- Harvest complete --------")
+    except Exception as e:
+        print(f"Harvest Error: {e}")
+    finally:
+        if ssh is not None:
+            ssh.close()
+    return fetched
+
+def summarize_metrics(LOCAL_PATH):
+    """Aggregates harvested per-phase metrics.jsonl files.
+
+    Writes metrics_by_stage.csv and metrics_by_batch.csv next to the phase
+    directories and returns both tables, or None when no metrics exist.
+    """
+    records = []
+    for path in glob.glob(os.path.join(LOCAL_PATH, "*", "metrics.jsonl")):
+        with open(path, "r") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    if not records:
+        return None
+
+    df = pd.DataFrame(records)
+    df["batch"] = df["batch"].astype(str)
+    by_stage = df.groupby("stage").agg(
+        runs=("wall_s", "size"),
+        failures=("exit", lambda x: int((x != 0).sum())),
+        wall_total_s=("wall_s", "sum"),
+        wall_mean_s=("wall_s", "mean"),
+        wall_max_s=("wall_s", "max"),
+        cpu_total_s=("cpu_s", "sum"),
+        max_rss_kb=("max_rss_kb", "max"),
+        read_bytes=("read_bytes", "sum"),
+        write_bytes=("write_bytes", "sum"),
+    ).sort_values("wall_total_s", ascending=False)
+
+    # Phases in a batch run side by side, so the slowest phase sets its length
+    per_phase = df.groupby(["batch", "phase"]).agg(wall_s=("wall_s", "sum"),
+                                                   max_rss_kb=("max_rss_kb", "max"))
+    by_batch = per_phase.groupby("batch").agg(
+        phases=("wall_s", "size"),
+        slowest_phase_s=("wall_s", "max"),
+        phase_wall_total_s=("wall_s", "sum"),
+        max_rss_kb=("max_rss_kb", "max"),
+    )
+
+    by_stage.to_csv(os.path.join(LOCAL_PATH, "metrics_by_stage.csv"))
+    by_batch.to_csv(os.path.join(LOCAL_PATH, "metrics_by_batch.csv"))
+    return by_stage, by_batch
+
+def summarize_disk(LOCAL_PATH):
+    """Collects the per-phase disk.json reports into disk_by_phase.csv."""
+    reports = []
+    for path in glob.glob(os.path.join(LOCAL_PATH, "*", "disk.json")):
+        with open(path, "r") as f:
+            reports.append(json.load(f))
+    if not reports:
+        return None
+    df = pd.DataFrame(reports).sort_values("phase").set_index("phase")
+    df.to_csv(os.path.join(LOCAL_PATH, "disk_by_phase.csv"))
+    return df
+
+# =============================================================================
+# Job monitoring
+# Keeps one SSH session open and polls SLURM plus the phase flags/outputs in a
+# single round trip. The command runner is pluggable so the monitor can be
+# pointed at a local stand-in scheduler (the fake squeue/sacct in
+# tests/fake_slurm on the PATH, with local_runner).
+# =============================================================================
+
+TERMINAL_STATES = {
+    "COMPLETED", "FAILED", "CANCELLED", "TIMEOUT", "OUT_OF_MEMORY",
+    "NODE_FAIL", "PREEMPTED", "BOOT_FAIL", "DEADLINE",
+}
+
+
+def ssh_runner(ssh):
+    """Returns a command runner that executes on an open paramiko session."""
+    def run(cmd):
+        stdin, stdout, stderr = ssh.exec_command(cmd)
+        stdout.channel.recv_exit_status()
+        return stdout.read().decode()
+    return run
+
+
+def local_runner(cmd):
+    """Command runner for testing against a local stand-in scheduler."""
+    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+    return result.stdout
+
+
+def flag_phase(name):
+    """Phase number of a done_<phase>.flag or failed_<phase>.flag name."""
+    return int(name.split("_", 1)[1].split(".", 1)[0])
+
+
+def parse_failed_flag(line):
+    """(phase, stage, exit code) from a `grep -H . failed_*.flag` line."""
+    name, _, body = line.partition(":")
+    stage, _, rc = body.strip().partition(" ")
+    return flag_phase(name), stage, int(rc) if rc.strip().lstrip("-").isdigit() else None
+
+
+def read_phase_status(run_command, remote_path):
+    """Finished phases, failed phases {phase: (stage, exit code)} and live jobs of a run.
+
+    Live jobs are the user's pending or running SLURM jobs whose working
+    directory is the run directory (the batch scripts' #SBATCH -D).
+    """
+    output = run_command(f"""cd {remote_path} || exit 1
+echo '##DONE'
+ls done_*.flag 2>/dev/null
+echo '##FAILED'
+grep -H . failed_*.flag 2>/dev/null
+echo '##QUEUE'
+squeue -h -u "$USER" -o '%i|%T|%Z' 2>/dev/null
+""")
+    run_dir = remote_path.rstrip("/")
+    done, failed, active, section = set(), {}, {}, None
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith("##"):
+            section = line[2:]
+        elif line and section == "DONE":
+            done.add(flag_phase(line))
+        elif line and section == "FAILED":
+            phase, stage, rc = parse_failed_flag(line)
+            failed[phase] = (stage, rc)
+        elif line and section == "QUEUE":
+            job, state, work_dir = (line.split("|") + ["", ""])[:3]
+            if work_dir.rstrip("/") == run_dir:
+                active[job] = state
+    return done, failed, active
+
+
+def scale_runtime(runtime, factor):
+    """Multiplies a SLURM time limit (M, M:S, H:M:S, D-H, D-H:M or D-H:M:S) by factor."""
+    days, _, clock = runtime.strip().rpartition("-")
+    parts = [int(x) for x in clock.split(":")]
+    if days:
+        # After a day part the fields are hours, minutes, seconds
+        parts += [0] * (3 - len(parts))
+    if len(parts) == 1:
+        seconds = parts[0] * 60
+    elif len(parts) == 2:
+        seconds = parts[0] * 60 + parts[1]
+    else:
+        seconds = parts[0] * 3600 + parts[1] * 60 + parts[2]
+    seconds = int(np.ceil((seconds + int(days or 0) * 86400) * factor))
+    d, rest = divmod(seconds, 86400)
+    h, rest = divmod(rest, 3600)
+    m, sec = divmod(rest, 60)
+    return f"{d}-{h:02d}:{m:02d}:{sec:02d}" if d else f"{h}:{m:02d}:{sec:02d}"
+
+
+class JobMonitor:
+    """Asynchronously follows submitted phase batches until they finish."""
+
+    def __init__(self, run_command, remote_path, job_ids, phase_bins,
+                 expected_flags, on_update, poll_interval=60):
+        self.run_command = run_command
+        self.remote_path = remote_path
+        self.job_ids = [str(j) for j in job_ids]
+        self.phase_bins = phase_bins
+        self.expected_flags = expected_flags
+        self.on_update = on_update
+        self.poll_interval = poll_interval
+        self.job_states = {}
+        self.flags = set()
+        self.failed = {}
+        self.analysis_job = None
+        self.analysis_state = None
+        self.outputs = set()
+        self._stopped = False
+
+    def query_command(self):
+        """One shell command covering every job, flag and phase output."""
+        ids = ",".join(self.job_ids) or "0"
+        return f"""cd {self.remote_path} || exit 1
+echo '##SACCT'
+sacct -n -X -P -j {ids} -o JobID,State 2>/dev/null
+echo '##SQUEUE'
+squeue -h -j {ids} -o '%i %T' 2>/dev/null
+echo '##FLAGS'
+ls done_*.flag 2>/dev/null
+echo '##FAILED'
+grep -H . failed_*.flag 2>/dev/null
+echo '##OUTPUTS'
+ls -d */spectral_pars.npy 2>/dev/null
+echo '##ANALYSIS'
+AJ=$(cat analysis_job.id 2>/dev/null)
+if [ -n "$AJ" ]; then
+    echo "$AJ"
+    sacct -n -X -P -j "$AJ" -o JobID,State 2>/dev/null
+    squeue -h -j "$AJ" -o '%i|%T' 2>/dev/null
+fi
+"""
+
+    def parse(self, output):
+        """Splits the query output into job states, flags, failures, finished phases
+        and the analysis job with its state."""
+        states, flags, failed, outputs = {}, set(), {}, set()
+        analysis_job, analysis_state = None, None
+        section = None
+        for line in output.splitlines():
+            line = line.strip()
+            if line.startswith("##"):
+                section = line[2:]
+                continue
+            if not line:
+                continue
+            if section == "SACCT":
+                job, _, state = line.partition("|")
+                states[job] = state.split()[0] if state else "UNKNOWN"
+            elif section == "SQUEUE":
+                # squeue is live, so it overrides a lagging accounting record
+                parts = line.split()
+                if len(parts) >= 2:
+                    states[parts[0]] = parts[1]
+            elif section == "FLAGS":
+                flags.add(line)
+            elif section == "FAILED":
+                phase, stage, rc = parse_failed_flag(line)
+                failed[phase] = (stage, rc)
+            elif section == "OUTPUTS":
+                outputs.add(line.split("/")[0])
+            elif section == "ANALYSIS":
+                job, _, state = line.partition("|")
+                if not state:
+                    analysis_job = job
+                elif job == analysis_job:
+                    # squeue comes last, so a live state wins over accounting
+                    analysis_state = state.split()[0]
+        return states, flags, failed, outputs, analysis_job, analysis_state
+
+    def update(self, output):
+        """Applies one poll result and reports what changed."""
+        states, flags, failed, outputs, analysis_job, analysis_state = self.parse(output)
+        for job in self.job_ids:
+            state = states.get(job)
+            if state and state != self.job_states.get(job):
+                previous = self.job_states.get(job, "SUBMITTED")
+                self.on_update(f"Job {job}: {previous} → {state}")
+                self.job_states[job] = state
+        if flags != self.flags:
+            self.flags = flags
+            self.on_update(f"Phase flags: {len(flags)}/{self.expected_flags}")
+        for phase in sorted(set(failed) - set(self.failed)):
+            stage, rc = failed[phase]
+            self.on_update(f"⚠️ Phase {phase} failed in {stage} (exit {rc})")
+        self.failed = failed
+        for phase in sorted(outputs - self.outputs, key=lambda x: int(x) if x.isdigit() else 1e9):
+            self.on_update(f"Phase {phase} results ready")
+        self.outputs |= outputs
+        if analysis_job and analysis_job != self.analysis_job:
+            self.analysis_job = analysis_job
+            self.on_update(f"Analysis job {analysis_job} submitted")
+        if analysis_state and analysis_state != self.analysis_state:
+            self.on_update(f"Analysis job {self.analysis_job}: {self.analysis_state or 'SUBMITTED'} → {analysis_state}")
+            self.analysis_state = analysis_state
+
+    def finished(self):
+        """True once nothing else can change for the tracked run."""
+        if len(self.outputs) >= self.phase_bins:
+            return True
+        if self.analysis_state in TERMINAL_STATES:
+            return True
+        jobs_done = all(self.job_states.get(j) in TERMINAL_STATES for j in self.job_ids)
+        # Once every batch is gone, analysis only runs if all flags were written,
+        # and the last batch records its job ID before it exits
+        return jobs_done and (len(self.flags) < self.expected_flags or self.analysis_job is None)
+
+    def stop(self):
+        self._stopped = True
+
+    async def poll(self):
+        loop = asyncio.get_running_loop()
+        output = await loop.run_in_executor(None, self.run_command, self.query_command())
+        self.update(output)
+
+    async def run(self):
+        self.on_update(f"Monitoring {len(self.job_ids)} jobs in {self.remote_path}")
+        while not self._stopped:
+            try:
+                await self.poll()
+            except Exception as e:
+                self.on_update(f"Monitor poll error: {e}")
+            if self.finished():
+                break
+            await asyncio.sleep(self.poll_interval)
+        failed = [j for j in self.job_ids if self.job_states.get(j) not in (None, "COMPLETED")
+                  and self.job_states.get(j) in TERMINAL_STATES]
+        if failed:
+            self.on_update(f"⚠️ Jobs ended abnormally: {', '.join(failed)}")
+        if self.analysis_state in TERMINAL_STATES and self.analysis_state != "COMPLETED":
+            self.on_update(f"⚠️ Analysis job {self.analysis_job} ended {self.analysis_state}")
+        self.on_update(f"Monitor finished: {len(self.flags)}/{self.expected_flags} flags, "
+                       f"{len(self.outputs)}/{self.phase_bins} phases analysed")
+        if len(self.flags) < self.expected_flags:
+            self.on_update("⚠️ Some phases did not finish; use Resubmit Failed Phases to rerun them.")
+
+
+class StatusBridge(QObject):
+    """Carries monitor messages from the worker thread onto the Qt thread."""
+    message = pyqtSignal(str)
+    image = pyqtSignal(str)
+
+
+def monitor_in_background(config, remote_path, job_ids, phase_bins,
+                          expected_flags, on_update):
+    """Runs a JobMonitor on its own thread over a persistent SSH session."""
+    poll_interval = config.get("monitor", {}).get("poll_interval", 60)
+
+    def worker():
+        ssh = None
+        try:
+            ssh = create_ssh_client(config["ssh"]["host"], config["ssh"]["username"],
+                                    config["ssh"]["key_path"])
+            ssh.get_transport().set_keepalive(30)
+            monitor = JobMonitor(ssh_runner(ssh), remote_path, job_ids, phase_bins,
+                                 expected_flags, on_update, poll_interval)
+            asyncio.run(monitor.run())
+        except Exception as e:
+            on_update(f"Monitor error: {e}")
+        finally:
+            if ssh is not None:
+                ssh.close()
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    return thread
 
 # =============================================================================
 # Below loads the setup parameters...
@@ -165,14 +888,1041 @@ def create_config(config_path):
     return config
 
 
+_CONFIG_CACHE = {}
+
+
 def load_config(config_path="setup.yaml"):
+    """Reads setup.yaml once per process; later calls return the same dict."""
     config_path = os.path.expanduser(config_path)
+    if config_path in _CONFIG_CACHE:
+        return _CONFIG_CACHE[config_path]
 
     if not os.path.exists(config_path):
-        return create_config(config_path)
+        config = create_config(config_path)
+    else:
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
+    _CONFIG_CACHE[config_path] = config
+    return config
+
+# =============================================================================
+# Counts-cube geometry
+# One place that turns the ROI and energy settings into the gtbin cube and
+# the fermipy binning, so the two always agree. The cube side equals the
+# fermipy roiwidth (the Radius field, as in the original config) rounded up to
+# whole pixels. An optional coarser pixel below a split energy becomes a
+# second fermipy component (files *_01.fits).
+# =============================================================================
+
+EDISP_BINS = -2
+
+
+def cube_geometry(radius, emin, emax, ebins, binsz=0.1, low_binsz=None, split_energy=None):
+    """Returns one dict per binning component, lowest energies first."""
+    edges = np.logspace(np.log10(emin), np.log10(emax), ebins + 1)
+    bounds = [(0, ebins, binsz)]
+    if low_binsz and split_energy and emin < split_energy < emax:
+        # Split on the global energy grid so both components share its edges
+        k = int(np.clip(np.argmin(np.abs(np.log10(edges / split_energy))), 1, ebins - 1))
+        bounds = [(0, k, low_binsz), (k, ebins, binsz)]
+
+    components = []
+    for lo, hi, size in bounds:
+        npix = int(np.ceil(radius / size - 1e-9))
+        components.append({
+            "emin": float(f"{edges[lo]:.6g}"),
+            "emax": float(f"{edges[hi]:.6g}"),
+            "enumbins": hi - lo,
+            "binsperdec": round(float((hi - lo) / np.log10(edges[hi] / edges[lo])), 4),
+            "binsz": size,
+            "npix": npix,
+            "roiwidth": round(npix * size, 6),
+        })
+    return components
+
+
+def cube_footprint(components, edisp_bins=EDISP_BINS):
+    """Bytes of the float32 counts cubes and of one source's model maps."""
+    ccube = sum(c["npix"] ** 2 * c["enumbins"] * 4 for c in components)
+    srcmap = sum(c["npix"] ** 2 * (c["enumbins"] + 1 + 2 * abs(edisp_bins)) * 4
+                 for c in components)
+    return ccube, srcmap
+
+# =============================================================================
+# Local event-file tools
+# Vectorized helpers that read the FT1 file in row chunks. Phases follow the
+# gtmktime filter in gen_script: bin k (1-based) is centred on (k-1)/N.
+# =============================================================================
+
+EVENT_CHUNK_ROWS = 2_000_000
+
+
+def met_to_mjd(met):
+    """Mission elapsed time to MJD, using the same offset as gen_script."""
+    return met / 86400 + 51910
+
+
+def fold_phase(met, t0, period):
+    """Orbital phase in [0, 1) for MET times given T0 (MJD) and period (days)."""
+    return np.mod((met_to_mjd(met) - t0) / period, 1.0)
+
+
+def phase_bin_index(phase, phase_bins):
+    """0-based bin of each phase, with bin k centred on k/phase_bins."""
+    return np.floor(phase * phase_bins + 0.5).astype(np.int64) % phase_bins
+
+
+# Columnar cache: <event file>.fpcache/<COLUMN>.npy in native byte order plus
+# a meta.json keyed on the event file's size and mtime. Once built, every scan
+# reads zero-copy memory maps instead of decoding the FITS table.
+EVENT_CACHE_COLUMNS = ["TIME", "ENERGY", "RA", "DEC", "PULSE_PHASE", "EVENT_CLASS",
+                       "EVENT_TYPE", "ZENITH_ANGLE"]
+EVENT_CACHE_VERSION = 1
+# Serializes cache and index builds between the GUI and quick-look threads
+_EVENT_CACHE_LOCK = threading.RLock()
+
 
-    with open(config_path, "r") as f:
-        return yaml.safe_load(f)
+def event_cache_dir(event_file):
+    return event_file + ".fpcache"
+
+
+def builder_suffix():
+    """Temp-file suffix unique to this process and thread."""
+    return f".{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def event_file_id(event_file):
+    st = os.stat(event_file)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def read_event_cache_meta(event_file):
+    """meta.json of the cache if it still matches the event file, else None."""
+    try:
+        with open(os.path.join(event_cache_dir(event_file), "meta.json"), "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != EVENT_CACHE_VERSION or meta.get("source") != event_file_id(event_file):
+        return None
+    return meta
+
+
+def open_event_cache(event_file, columns):
+    """Read-only memory maps of the columns and the row count, or None.
+
+    None means the cache is missing, stale or lacks one of the columns.
+    """
+    meta = read_event_cache_meta(event_file)
+    if meta is None or not set(columns) <= set(meta["columns"]):
+        return None
+    cache_dir = event_cache_dir(event_file)
+    return {col: np.load(os.path.join(cache_dir, f"{col}.npy"), mmap_mode="r")
+            for col in columns}, meta["rows"]
+
+
+@traced("build_event_cache", "io")
+def ensure_event_cache(event_file, columns=EVENT_CACHE_COLUMNS):
+    """Builds, refreshes or extends the cache. Returns the cached column names.
+
+    Columns the FT1 file does not have are remembered and skipped. The FITS
+    table is streamed in EVENT_CHUNK_ROWS chunks, so memory stays bounded.
+    Builds in this process are serialized; files are written under names
+    unique to the builder and swapped in, so another process sees either the
+    old or the new file.
+    """
+    with _EVENT_CACHE_LOCK:
+        return _ensure_event_cache(event_file, columns)
+
+
+def _ensure_event_cache(event_file, columns):
+    cache_dir = event_cache_dir(event_file)
+    suffix = builder_suffix()
+    meta = read_event_cache_meta(event_file)
+    if meta is None:
+        # Stale column files are overwritten in place as they are rebuilt
+        meta = {"version": EVENT_CACHE_VERSION, "source": event_file_id(event_file),
+                "rows": 0, "columns": [], "absent": []}
+    todo = [c for c in columns if c not in meta["columns"] and c not in meta["absent"]]
+    if not todo:
+        return meta["columns"]
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with fits.open(event_file, memmap=True) as hdul:
+        data = hdul["EVENTS"].data
+        meta["absent"] += [c for c in todo if c not in data.columns.names]
+        todo = [c for c in todo if c in data.columns.names]
+        rows = meta["rows"] = len(data)
+        arrays = {}
+        for col in todo:
+            sample = np.asarray(data[col][:1])
+            arrays[col] = np.lib.format.open_memmap(
+                os.path.join(cache_dir, f"{col}.npy{suffix}"), mode="w+",
+                dtype=sample.dtype.newbyteorder("="), shape=(rows,) + sample.shape[1:])
+        for start in range(0, rows, EVENT_CHUNK_ROWS):
+            chunk = data[start:start + EVENT_CHUNK_ROWS]
+            for col, out in arrays.items():
+                out[start:start + len(chunk)] = np.asarray(chunk[col])
+        for out in arrays.values():
+            out.flush()
+        arrays.clear()
+    for col in todo:
+        os.replace(os.path.join(cache_dir, f"{col}.npy{suffix}"), os.path.join(cache_dir, f"{col}.npy"))
+
+    meta["columns"] += todo
+    with open(os.path.join(cache_dir, "meta.json" + suffix), "w") as f:
+        json.dump(meta, f)
+    os.replace(os.path.join(cache_dir, "meta.json" + suffix), os.path.join(cache_dir, "meta.json"))
+    return meta["columns"]
+
+
+def prepare_event_cache(event_file, mode, extra_columns=()):
+    """Builds the cache ("cache") or cache plus index ("index"); None does nothing.
+
+    Safe from worker threads: the mode is read from the widgets beforehand.
+    """
+    columns = EVENT_CACHE_COLUMNS + [c for c in extra_columns if c]
+    if mode == "index":
+        ensure_event_index(event_file, columns)
+    elif mode == "cache":
+        ensure_event_cache(event_file, columns)
+
+
+def iter_event_chunks(event_file, columns, chunk_rows=EVENT_CHUNK_ROWS, cone=None, window=None):
+    """Yields dicts of column arrays from the EVENTS table, one row chunk at a time.
+
+    cone=(ra, dec, rad) and window=(tmin, tmax) are hints: with a fresh event
+    index only the overlapping partitions are read, otherwise every row is.
+    Callers still apply their exact cuts. Without an index, reads from the
+    columnar cache when a fresh one holds every column.
+    """
+    indexed = open_event_index(event_file, columns)
+    if indexed is not None:
+        arrays, partitions = indexed
+        for start, stop in index_ranges(partitions, cone, window):
+            for lo in range(start, stop, chunk_rows):
+                hi = min(lo + chunk_rows, stop)
+                yield {col: arrays[col][lo:hi] for col in columns}
+        return
+    cached = open_event_cache(event_file, columns)
+    if cached is not None:
+        arrays, rows = cached
+        for start in range(0, rows, chunk_rows):
+            yield {col: arrays[col][start:start + chunk_rows] for col in columns}
+        return
+    with fits.open(event_file, memmap=True) as hdul:
+        data = hdul["EVENTS"].data
+        for start in range(0, len(data), chunk_rows):
+            chunk = data[start:start + chunk_rows]
+            yield {col: np.asarray(chunk[col]) for col in columns}
+
+
+def roi_mask(ra, dec, ra0, dec0, radius):
+    """Events within radius (deg) of (ra0, dec0)."""
+    ra, dec = np.radians(ra), np.radians(dec)
+    ra0, dec0 = np.radians(ra0), np.radians(dec0)
+    cos_sep = (np.sin(dec) * np.sin(dec0)
+               + np.cos(dec) * np.cos(dec0) * np.cos(ra - ra0))
+    return cos_sep >= np.cos(np.radians(radius))
+
+
+@traced("phase_costs", "compute")
+def estimate_phase_costs(event_file, ra, dec, rad, t0, period, phase_bins,
+                         tmin, tmax, emin, emax):
+    """ROI photon counts per phase bin, used as the expected cost of each phase."""
+    counts = np.zeros(phase_bins, dtype=np.int64)
+    for chunk in iter_event_chunks(event_file, ["TIME", "ENERGY", "RA", "DEC"],
+                                   cone=(ra, dec, rad), window=(tmin, tmax)):
+        keep = ((chunk["TIME"] >= tmin) & (chunk["TIME"] <= tmax)
+                & (chunk["ENERGY"] >= emin) & (chunk["ENERGY"] <= emax)
+                & roi_mask(chunk["RA"], chunk["DEC"], ra, dec, rad))
+        idx = phase_bin_index(fold_phase(chunk["TIME"][keep], t0, period), phase_bins)
+        counts += np.bincount(idx, minlength=phase_bins)
+    return counts
+
+
+@traced("plan_batches", "compute")
+def plan_phase_batches(phases, batch_size, costs=None):
+    """Splits phases into batches of at most batch_size.
+
+    Without costs the phases stay in contiguous order. With costs, the most
+    expensive phases are placed first and each goes to the batch with the
+    least accumulated cost, so every node's queue starts with its stragglers.
+    """
+    n_batches = (len(phases) + batch_size - 1) // batch_size
+    if costs is None:
+        return [phases[i:i+batch_size] for i in range(0, len(phases), batch_size)]
+    batches = [[] for _ in range(n_batches)]
+    loads = [0.0] * n_batches
+    for phase in sorted(phases, key=lambda p: costs[p - 1], reverse=True):
+        open_batches = [b for b in range(n_batches) if len(batches[b]) < batch_size]
+        b = min(open_batches, key=lambda b: loads[b])
+        batches[b].append(phase)
+        loads[b] += costs[phase - 1]
+    return batches
+
+def evclass_mask(event_class, evclass=128):
+    """Events whose EVENT_CLASS bitmask includes evclass.
+
+    Handles both the 32X bit-array column (MSB first) and integer columns.
+    """
+    event_class = np.asarray(event_class)
+    if event_class.dtype == bool:
+        bit = int(np.log2(evclass))
+        return event_class[:, event_class.shape[1] - 1 - bit]
+    return (event_class & evclass) != 0
+
+
+SELECTION_COLUMNS = ["TIME", "ENERGY", "RA", "DEC", "ZENITH_ANGLE", "EVENT_CLASS"]
+
+
+def select_events(chunk, ra, dec, rad, tmin, tmax, emin, emax, zmax=90.0, evclass=128):
+    """gtselect-equivalent mask over a chunk holding SELECTION_COLUMNS."""
+    return ((chunk["TIME"] >= tmin) & (chunk["TIME"] <= tmax)
+            & (chunk["ENERGY"] >= emin) & (chunk["ENERGY"] <= emax)
+            & (chunk["ZENITH_ANGLE"] <= zmax)
+            & evclass_mask(chunk["EVENT_CLASS"], evclass)
+            & roi_mask(chunk["RA"], chunk["DEC"], ra, dec, rad))
+
+
+def ccube_wcs(ra, dec, npix, binsz):
+    """AIT celestial grid matching gtbin's ccube for xref/yref = ra/dec."""
+    wcs = WCS(naxis=2)
+    wcs.wcs.ctype = ["RA---AIT", "DEC--AIT"]
+    wcs.wcs.crval = [ra, dec]
+    wcs.wcs.crpix = [(npix + 1) / 2, (npix + 1) / 2]
+    wcs.wcs.cdelt = [-binsz, binsz]
+    return wcs
+
+
+def write_ccube(path, counts, wcs, energy_edges, gti):
+    """Writes a CCUBE with the primary image, EBOUNDS (keV) and GTI HDUs."""
+    header = wcs.to_header()
+    header["WCSAXES"] = 3
+    header["CTYPE3"] = "Energy"
+    header["CUNIT3"] = "MeV"
+    header["CRPIX3"] = 1.0
+    header["CRVAL3"] = float(energy_edges[0])
+    header["CDELT3"] = float(energy_edges[1] - energy_edges[0])
+    header["TELESCOP"] = "GLAST"
+    header["INSTRUME"] = "LAT"
+    primary = fits.PrimaryHDU(counts.astype(np.float32), header=header)
+    ebounds = fits.BinTableHDU.from_columns([
+        fits.Column("CHANNEL", "J", array=np.arange(1, len(energy_edges))),
+        fits.Column("E_MIN", "E", unit="keV", array=energy_edges[:-1] * 1e3),
+        fits.Column("E_MAX", "E", unit="keV", array=energy_edges[1:] * 1e3),
+    ], name="EBOUNDS")
+    gti_hdu = fits.BinTableHDU.from_columns([
+        fits.Column("START", "D", unit="s", array=gti[0]),
+        fits.Column("STOP", "D", unit="s", array=gti[1]),
+    ], name="GTI")
+    fits.HDUList([primary, ebounds, gti_hdu]).writeto(path, overwrite=True)
+
+
+def build_phase_ccubes(event_file, out_dir, ra, dec, rad, t0, period, phase_bins,
+                       tmin, tmax, geometry, zmax=90.0, evclass=128):
+    """Counts cubes for every phase bin from a single pass over the event file.
+
+    Events get the same cuts as gtselect, are folded like gen_script and are
+    histogrammed jointly over (phase, energy, y, x) with one bincount per
+    chunk. Writes <out_dir>/<phase>/ccube_<k>.fits for each component k and
+    returns the list of files. The GTI is the event file's own, so the cubes
+    are for quick looks rather than likelihood input.
+    """
+    grids = []
+    for c in geometry:
+        edges = np.logspace(np.log10(c["emin"]), np.log10(c["emax"]), c["enumbins"] + 1)
+        grids.append((c, ccube_wcs(ra, dec, c["npix"], c["binsz"]), edges,
+                      np.zeros(phase_bins * c["enumbins"] * c["npix"] ** 2, dtype=np.int64)))
+
+    emin, emax = geometry[0]["emin"], geometry[-1]["emax"]
+    for chunk in iter_event_chunks(event_file, SELECTION_COLUMNS,
+                                   cone=(ra, dec, rad), window=(tmin, tmax)):
+        keep = select_events(chunk, ra, dec, rad, tmin, tmax, emin, emax, zmax, evclass)
+        phase_idx = phase_bin_index(fold_phase(chunk["TIME"][keep], t0, period), phase_bins)
+        energy = chunk["ENERGY"][keep]
+        ev_ra, ev_dec = chunk["RA"][keep], chunk["DEC"][keep]
+
+        for c, wcs, edges, counts in grids:
+            npix, ne = c["npix"], c["enumbins"]
+            x, y = wcs.wcs_world2pix(ev_ra, ev_dec, 0)
+            ix = np.floor(x + 0.5).astype(np.int64)
+            iy = np.floor(y + 0.5).astype(np.int64)
+            ie = np.searchsorted(edges, energy, side="right") - 1
+            inside = ((ix >= 0) & (ix < npix) & (iy >= 0) & (iy < npix)
+                      & (ie >= 0) & (ie < ne))
+            flat = ((phase_idx[inside] * ne + ie[inside]) * npix + iy[inside]) * npix + ix[inside]
+            counts += np.bincount(flat, minlength=counts.size)
+
+    with fits.open(event_file, memmap=True) as hdul:
+        gti = (np.asarray(hdul["GTI"].data["START"]), np.asarray(hdul["GTI"].data["STOP"]))
+
+    written = []
+    for k, (c, wcs, edges, counts) in enumerate(grids):
+        cubes = counts.reshape(phase_bins, c["enumbins"], c["npix"], c["npix"])
+        for phase in range(phase_bins):
+            phase_dir = os.path.join(out_dir, str(phase + 1))
+            os.makedirs(phase_dir, exist_ok=True)
+            path = os.path.join(phase_dir, f"ccube_{k:02d}.fits")
+            write_ccube(path, cubes[phase], wcs, edges, gti)
+            written.append(path)
+    return written
+
+# =============================================================================
+# Sky/time event index
+# <event file>.fpindex/ holds a copy of the cached columns reordered by
+# (HEALPix nested pixel, time block), plus a partition table with each
+# partition's row range, photon centroid, cap radius and time span. Cone and
+# time-window scans then read only the partitions that can overlap them.
+# Local tools only: gtselect on the cluster still reads the FT1 file.
+# =============================================================================
+
+EVENT_INDEX_VERSION = 1
+EVENT_INDEX_NSIDE = 8                # ~7.3 deg pixels
+EVENT_INDEX_BLOCK_S = 180 * 86400.0  # time-block length (s)
+
+
+def ang2pix_nest(nside, ra, dec):
+    """HEALPix NESTED pixel of each (ra, dec) in degrees; nside a power of 2."""
+    z = np.sin(np.radians(dec))
+    za = np.abs(z)
+    tt = np.mod(np.radians(ra), 2 * np.pi) * (2 / np.pi)   # in [0, 4)
+
+    # Equatorial belt
+    temp1 = nside * (0.5 + tt)
+    temp2 = nside * z * 0.75
+    jp = (temp1 - temp2).astype(np.int64)
+    jm = (temp1 + temp2).astype(np.int64)
+    ifp, ifm = jp // nside, jm // nside
+    face_eq = np.where(ifp == ifm, ifp | 4, np.where(ifp < ifm, ifp, ifm + 8))
+    ix_eq = jm & (nside - 1)
+    iy_eq = nside - (jp & (nside - 1)) - 1
+
+    # Polar caps
+    ntt = np.minimum(tt.astype(np.int64), 3)
+    tp = tt - ntt
+    tmp = nside * np.sqrt(3 * (1 - za))
+    jp_p = np.minimum((tp * tmp).astype(np.int64), nside - 1)
+    jm_p = np.minimum(((1 - tp) * tmp).astype(np.int64), nside - 1)
+    north = z > 0
+    face_p = np.where(north, ntt, ntt + 8)
+    ix_p = np.where(north, nside - jm_p - 1, jp_p)
+    iy_p = np.where(north, nside - jp_p - 1, jm_p)
+
+    equatorial = za <= 2 / 3
+    face = np.where(equatorial, face_eq, face_p)
+    ix = np.where(equatorial, ix_eq, ix_p)
+    iy = np.where(equatorial, iy_eq, iy_p)
+
+    # Interleave bits: x on even positions, y on odd
+    sub = np.zeros_like(ix)
+    for bit in range(int(np.log2(nside))):
+        sub |= ((ix >> bit) & 1) << (2 * bit)
+        sub |= ((iy >> bit) & 1) << (2 * bit + 1)
+    return face * nside * nside + sub
+
+
+def radec_to_xyz(ra, dec):
+    # float64 even for float32 columns: caps of a few arcsec need it near cos = 1
+    ra, dec = np.radians(np.asarray(ra, dtype=np.float64)), np.radians(np.asarray(dec, dtype=np.float64))
+    return np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)], axis=-1)
+
+
+def event_index_dir(event_file):
+    return event_file + ".fpindex"
+
+
+def read_event_index_meta(event_file):
+    """meta.json of the index if it still matches the event file, else None."""
+    try:
+        with open(os.path.join(event_index_dir(event_file), "meta.json"), "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != EVENT_INDEX_VERSION or meta.get("source") != event_file_id(event_file):
+        return None
+    return meta
+
+
+def open_event_index(event_file, columns):
+    """Memory-mapped sorted columns and the partition table, or None."""
+    meta = read_event_index_meta(event_file)
+    if meta is None or not set(columns) <= set(meta["columns"]):
+        return None
+    index_dir = event_index_dir(event_file)
+    arrays = {col: np.load(os.path.join(index_dir, f"{col}.npy"), mmap_mode="r") for col in columns}
+    with np.load(os.path.join(index_dir, "partitions.npz")) as parts:
+        partitions = {key: parts[key] for key in parts.files}
+    return arrays, partitions
+
+
+def index_ranges(partitions, cone=None, window=None):
+    """Merged [start, stop) row ranges of the partitions a query can touch."""
+    keep = np.ones(len(partitions["start"]), dtype=bool)
+    if cone is not None:
+        ra, dec, rad = cone
+        cos_sep = partitions["xyz"] @ radec_to_xyz(ra, dec)
+        sep = np.degrees(np.arccos(np.clip(cos_sep, -1, 1)))
+        keep &= sep <= rad + partitions["cap"] + 1e-6
+    if window is not None:
+        tmin, tmax = window
+        keep &= (partitions["tmax"] >= tmin) & (partitions["tmin"] <= tmax)
+    ranges = []
+    for start, stop in zip(partitions["start"][keep], partitions["stop"][keep]):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = stop
+        else:
+            ranges.append([start, stop])
+    return [(int(a), int(b)) for a, b in ranges]
+
+
+@traced("build_event_index", "io")
+def ensure_event_index(event_file, columns=EVENT_CACHE_COLUMNS,
+                       nside=EVENT_INDEX_NSIDE, block_s=EVENT_INDEX_BLOCK_S):
+    """Builds the sky/time index from the columnar cache if it is missing or stale.
+
+    Returns the number of partitions. The build holds the int64 sort key and
+    order (16 bytes per event) plus one sorted column at a time; positions
+    are reduced in EVENT_CHUNK_ROWS chunks. On disk the index is a second,
+    sorted copy of the cached columns.
+    """
+    with _EVENT_CACHE_LOCK:
+        cached_columns = ensure_event_cache(event_file, columns)
+        meta = read_event_index_meta(event_file)
+        if (meta is not None and set(cached_columns) <= set(meta["columns"])
+                and meta["nside"] == nside and meta["block_s"] == block_s):
+            return meta["partitions"]
+        # Built under a builder-unique name, then swapped in as a whole
+        index_dir = event_index_dir(event_file)
+        build_dir = index_dir + builder_suffix()
+        os.makedirs(build_dir)
+        try:
+            meta = _build_event_index(event_file, build_dir, cached_columns, nside, block_s)
+            shutil.rmtree(index_dir, ignore_errors=True)
+            try:
+                os.rename(build_dir, index_dir)
+            except OSError:
+                pass  # another process swapped in an equivalent index first
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+        return meta["partitions"]
+
+
+def _build_event_index(event_file, index_dir, cached_columns, nside, block_s):
+    arrays, rows = open_event_cache(event_file, cached_columns)
+
+    time = arrays["TIME"]
+    t_origin = float(time.min()) if rows else 0.0
+    nblocks = int((float(time.max()) - t_origin) // block_s) + 1 if rows else 1
+    key = np.empty(rows, dtype=np.int64)
+    for lo in range(0, rows, EVENT_CHUNK_ROWS):
+        hi = min(lo + EVENT_CHUNK_ROWS, rows)
+        blocks = ((time[lo:hi] - t_origin) // block_s).astype(np.int64)
+        key[lo:hi] = ang2pix_nest(nside, arrays["RA"][lo:hi], arrays["DEC"][lo:hi]) * nblocks + blocks
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+    for col in cached_columns:
+        np.save(os.path.join(index_dir, f"{col}.npy"), np.asarray(arrays[col])[order])
+    del order
+
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if rows else np.zeros(0, dtype=np.int64)
+    stops = np.r_[starts[1:], rows].astype(np.int64)
+    del key
+    nparts = len(starts)
+    centroid = np.zeros((nparts, 3))
+    cos_far = np.ones(nparts)
+    tmins, tmaxs = np.full(nparts, np.inf), np.full(nparts, -np.inf)
+    # Sorted positions from the files just written, one chunk at a time
+    ra, dec, time = (np.load(os.path.join(index_dir, f"{col}.npy"), mmap_mode="r")
+                     for col in ("RA", "DEC", "TIME"))
+
+    def partition_chunks():
+        for lo in range(0, rows, EVENT_CHUNK_ROWS):
+            hi = min(lo + EVENT_CHUNK_ROWS, rows)
+            part = np.searchsorted(starts, np.arange(lo, hi), side="right") - 1
+            # Segments of the chunk, one per partition it touches
+            seg = np.flatnonzero(np.r_[True, part[1:] != part[:-1]])
+            yield lo, hi, part[seg], seg
+
+    for lo, hi, parts, seg in partition_chunks():
+        centroid[parts] += np.add.reduceat(radec_to_xyz(ra[lo:hi], dec[lo:hi]), seg, axis=0)
+        tmins[parts] = np.minimum(tmins[parts], np.minimum.reduceat(time[lo:hi], seg))
+        tmaxs[parts] = np.maximum(tmaxs[parts], np.maximum.reduceat(time[lo:hi], seg))
+    if nparts:
+        centroid /= np.linalg.norm(centroid, axis=1, keepdims=True)
+    # Cap radius: farthest photon of each partition from its centroid
+    for lo, hi, parts, seg in partition_chunks():
+        part = np.repeat(parts, np.diff(np.r_[seg, hi - lo]))
+        cos_sep = np.einsum("ij,ij->i", radec_to_xyz(ra[lo:hi], dec[lo:hi]), centroid[part])
+        cos_far[parts] = np.minimum(cos_far[parts], np.minimum.reduceat(cos_sep, seg))
+    cap = np.degrees(np.arccos(np.clip(cos_far, -1, 1)))
+    del ra, dec, time
+    np.savez(os.path.join(index_dir, "partitions.npz"), start=starts, stop=stops,
+             xyz=centroid, cap=cap, tmin=tmins, tmax=tmaxs)
+
+    meta = {"version": EVENT_INDEX_VERSION, "source": event_file_id(event_file), "rows": rows,
+            "columns": cached_columns, "nside": nside, "block_s": block_s,
+            "partitions": int(len(starts))}
+    with open(os.path.join(index_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+# =============================================================================
+# Preflight checks
+# Validates the run settings against the FT1/FT2 files before anything is
+# written or submitted. Only headers, DSS keywords and the GTI table are read,
+# never the event rows, so the checks take milliseconds.
+# =============================================================================
+
+SC_INTERVAL = 30.0   # nominal FT2 row length (s) when the FT2 is not local
+GTSELECT_EVCLASS = 128
+
+
+def event_file_paths(event_file):
+    """FT1 paths behind an Event File setting, expanding @list/.txt lists."""
+    listing = event_file[1:] if event_file.startswith("@") else event_file
+    if listing.endswith((".txt", ".lst")):
+        with open(listing, "r") as f:
+            return [line.strip() for line in f if line.strip()]
+    return [event_file]
+
+
+def parse_dss(header):
+    """Data-subspace keywords of an FT1 header as {DSTYP: DSVAL}."""
+    return {str(header[f"DSTYP{i}"]).strip(): str(header.get(f"DSVAL{i}", "")).strip()
+            for i in range(1, header.get("NDSKEYS", 0) + 1) if f"DSTYP{i}" in header}
+
+
+@traced("read_event_headers", "io")
+def read_event_headers(event_file):
+    """Time coverage, GTIs and DSS selections of the FT1 file(s)."""
+    tstart, tstop, gtis, dss = [], [], [], []
+    for path in event_file_paths(event_file):
+        with fits.open(path, memmap=True) as hdul:
+            header = hdul["EVENTS"].header
+            tstart.append(header["TSTART"])
+            tstop.append(header["TSTOP"])
+            dss.append(parse_dss(header))
+            gti = hdul["GTI"].data
+            gtis.append(np.column_stack([gti["START"], gti["STOP"]]))
+    return {"tstart": min(tstart), "tstop": max(tstop), "gti": np.vstack(gtis), "dss": dss}
+
+
+@traced("read_sc_header", "io")
+def read_sc_header(sc_file):
+    """Time coverage and mean row length of an FT2 file."""
+    with fits.open(sc_file, memmap=True) as hdul:
+        header = hdul["SC_DATA"].header
+        rows = header["NAXIS2"]
+        span = header["TSTOP"] - header["TSTART"]
+        return {"tstart": header["TSTART"], "tstop": header["TSTOP"],
+                "interval": span / rows if rows else SC_INTERVAL}
+
+
+def gti_exposure(gti, tmin, tmax):
+    """Seconds of good time inside [tmin, tmax]."""
+    overlap = np.minimum(gti[:, 1], tmax) - np.maximum(gti[:, 0], tmin)
+    return float(np.clip(overlap, 0, None).sum())
+
+
+def dss_range(value):
+    """(lo, hi) of a 'lo:hi' DSS value; None when it is not a range."""
+    lo, sep, hi = value.partition(":")
+    if not sep:
+        return None
+    try:
+        return (float(lo) if lo else -np.inf, float(hi) if hi else np.inf)
+    except ValueError:
+        return None
+
+
+def check_dss(dss, ra, dec, rad, emin, emax):
+    """Errors for cuts the FT1 selection already excludes."""
+    errors = []
+    for dstyp, dsval in dss.items():
+        if dstyp == "ENERGY":
+            bounds = dss_range(dsval)
+            if bounds and (emin < bounds[0] or emax > bounds[1]):
+                errors.append(f"Energy range {emin}–{emax} MeV exceeds the FT1 selection {dsval} MeV")
+        elif dstyp.startswith("POS(") and dsval.upper().startswith("CIRCLE("):
+            ra0, dec0, rad0 = (float(v) for v in dsval[7:-1].split(","))
+            sep = np.degrees(np.arccos(np.clip(
+                np.sin(np.radians(dec)) * np.sin(np.radians(dec0))
+                + np.cos(np.radians(dec)) * np.cos(np.radians(dec0)) * np.cos(np.radians(ra - ra0)),
+                -1, 1)))
+            if sep + rad > rad0 + 1e-6:
+                errors.append(f"ROI of {rad}° is not contained in the FT1 selection {dsval}")
+        elif dstyp.startswith("BIT_MASK(EVENT_CLASS,"):
+            evclass = int(dstyp.split(",")[1])
+            # Classes are nested: a higher bit is a stricter subset
+            if evclass > GTSELECT_EVCLASS:
+                errors.append(f"FT1 is already cut to event class {evclass}; "
+                              f"gtselect evclass={GTSELECT_EVCLASS} needs a looser selection")
+    return errors
+
+
+def preflight_checks(event_file, sc_file, ra, dec, rad, emin, emax, windows,
+                     ephemerides, phase_bins=None, joint=False):
+    """Checks a run before generation. Returns (errors, warnings).
+
+    windows are (tmin, tmax) MET pairs and ephemerides (t0, period) pairs, one
+    per epoch. Files that are not readable locally are skipped with a warning.
+    """
+    errors, warnings = [], []
+
+    if not 0 <= ra < 360 or not -90 <= dec <= 90:
+        errors.append(f"RA/DEC ({ra}, {dec}) is not a valid J2000 position")
+    if not 0 < rad <= 180:
+        errors.append(f"Radius {rad}° must be in (0, 180]")
+    elif rad > 30:
+        warnings.append(f"Radius {rad}° is unusually large for a binned ROI")
+    if emin >= emax:
+        errors.append(f"Min Energy {emin} MeV must be below Max Energy {emax} MeV")
+    elif emin < 20:
+        warnings.append(f"Min Energy {emin} MeV is below the LAT instrument response")
+
+    for tmin, tmax in windows:
+        if tmin >= tmax:
+            errors.append(f"Time window {tmin}–{tmax} MET is empty")
+    if joint:
+        # gen_script_multiple and gtselect_script_multiple join exactly two epochs
+        if len(windows) != 2:
+            errors.append(f"Joint Epoch Fitting needs exactly 2 epochs, got {len(windows)}")
+        ordered = sorted(windows)
+        for (lo1, hi1), (lo2, hi2) in zip(ordered, ordered[1:]):
+            if lo2 < hi1:
+                errors.append(f"Joint epochs {lo1}–{hi1} and {lo2}–{hi2} overlap")
+
+    interval = SC_INTERVAL
+    if sc_file and os.path.exists(sc_file):
+        try:
+            sc = read_sc_header(sc_file)
+            interval = sc["interval"]
+            for tmin, tmax in windows:
+                if tmin < sc["tstart"] or tmax > sc["tstop"]:
+                    errors.append(f"Spacecraft File covers {sc['tstart']:.0f}–{sc['tstop']:.0f} MET, "
+                                  f"not the window {tmin:.0f}–{tmax:.0f}")
+        except (OSError, KeyError) as e:
+            warnings.append(f"Could not read Spacecraft File headers: {e}")
+    else:
+        warnings.append(f"Spacecraft File {sc_file} is not readable locally; coverage not checked")
+
+    event_paths = event_file_paths(event_file) if event_file and os.path.exists(event_file.lstrip("@")) else []
+    if event_paths and all(os.path.exists(p) for p in event_paths):
+        try:
+            ft1 = read_event_headers(event_file)
+            for tmin, tmax in windows:
+                if tmin < ft1["tstart"] or tmax > ft1["tstop"]:
+                    errors.append(f"Event File covers {ft1['tstart']:.0f}–{ft1['tstop']:.0f} MET, "
+                                  f"not the window {tmin:.0f}–{tmax:.0f}")
+                elif gti_exposure(ft1["gti"], tmin, tmax) <= 0:
+                    errors.append(f"Event File has no good time in {tmin:.0f}–{tmax:.0f} MET")
+            for dss in ft1["dss"]:
+                errors.extend(check_dss(dss, ra, dec, rad, emin, emax))
+        except (OSError, KeyError, ValueError) as e:
+            warnings.append(f"Could not read Event File headers: {e}")
+    else:
+        warnings.append(f"Event File {event_file} is not readable locally; coverage not checked")
+
+    if phase_bins:
+        # gtmktime keeps an FT2 row only if both its START and STOP fall in the bin
+        for t0, period in ephemerides:
+            width = period * 86400 / phase_bins
+            kept = max(0.0, (width - interval) / width)
+            if kept <= 0:
+                errors.append(f"Phase bins of {width:.0f} s are shorter than the {interval:.0f} s "
+                              f"spacecraft intervals; no livetime would survive gtmktime")
+            elif kept < 0.5:
+                warnings.append(f"Phase bins of {width:.0f} s keep only ~{kept:.0%} of the livetime "
+                                f"with {interval:.0f} s spacecraft intervals")
+    # Epochs sharing an ephemeris or FT1 selection repeat the same message
+    return list(dict.fromkeys(errors)), list(dict.fromkeys(warnings))
+
+# =============================================================================
+# Periodicity statistics
+# Z^2_m (Buccheri et al. 1983) and the H-test (de Jager et al. 1989), built
+# from per-harmonic cosine/sine sums so photons can be streamed in chunks.
+# =============================================================================
+
+def harmonic_sums(phases, nharm):
+    """Sums of cos(2πkφ) and sin(2πkφ) for k = 1..nharm."""
+    k = np.arange(1, nharm + 1)[:, None]
+    arg = 2 * np.pi * k * phases[None, :]
+    return np.cos(arg).sum(axis=1), np.sin(arg).sum(axis=1)
+
+
+def z2_from_sums(cos_sums, sin_sums, n):
+    """Z^2_m for every m = 1..nharm from the harmonic sums of n photons."""
+    return 2.0 / n * np.cumsum(cos_sums ** 2 + sin_sums ** 2)
+
+
+def chi2_sf_even(x, dof):
+    """Chance probability of a chi^2 value with an even number of dof."""
+    terms = [(x / 2) ** j / np.prod(np.arange(1, j + 1)) for j in range(dof // 2)]
+    return float(np.exp(-x / 2) * np.sum(terms))
+
+
+def htest(z2):
+    """H statistic, best harmonic and chance probability (de Jager & Büsching 2010)."""
+    m = np.arange(1, len(z2) + 1)
+    h = z2 - 4 * m + 4
+    best = int(np.argmax(h))
+    return float(h[best]), best + 1, float(np.exp(-0.4 * h[best]))
+
+
+def phaseogram(event_file, ra, dec, rad, t0, period, tmin, tmax, emin, emax,
+               nbins=20, nharm=20):
+    """Folds the ROI photons with the ephemeris and tests for modulation."""
+    counts = np.zeros(nbins, dtype=np.int64)
+    cos_sums = np.zeros(nharm)
+    sin_sums = np.zeros(nharm)
+    n = 0
+    for chunk in iter_event_chunks(event_file, SELECTION_COLUMNS,
+                                   cone=(ra, dec, rad), window=(tmin, tmax)):
+        keep = select_events(chunk, ra, dec, rad, tmin, tmax, emin, emax)
+        phases = fold_phase(chunk["TIME"][keep], t0, period)
+        counts += np.bincount((phases * nbins).astype(np.int64) % nbins, minlength=nbins)
+        c, s = harmonic_sums(phases, nharm)
+        cos_sums += c
+        sin_sums += s
+        n += len(phases)
+    if n == 0:
+        raise ValueError("No photons pass the ROI selection")
+
+    z2 = z2_from_sums(cos_sums, sin_sums, n)
+    h, m_best, h_prob = htest(z2)
+    return {
+        "counts": counts,
+        "edges": np.linspace(0, 1, nbins + 1),
+        "n": n,
+        "z2": z2,
+        "z2_2": float(z2[1]),
+        "z2_2_prob": chi2_sf_even(z2[1], 4),
+        "h": h,
+        "h_m": m_best,
+        "h_prob": h_prob,
+    }
+
+
+def roi_photon_times(event_file, ra, dec, rad, tmin, tmax, emin, emax):
+    """MET arrival times of the ROI-selected photons."""
+    times = [chunk["TIME"][select_events(chunk, ra, dec, rad, tmin, tmax, emin, emax)]
+             for chunk in iter_event_chunks(event_file, SELECTION_COLUMNS,
+                                            cone=(ra, dec, rad), window=(tmin, tmax))]
+    return np.concatenate(times) if times else np.zeros(0)
+
+
+# Photon times (days from T0) shared with each period-search worker process
+_SEARCH_DT = None
+SEARCH_PHOTON_BLOCK = 16384
+# Every worker holds its own photon times and trial x photon blocks, so the
+# default pool stays small however many cores the workstation has
+SEARCH_MAX_PROCESSES = 4
+
+
+def search_worker_bytes(n, trials_per_task=64):
+    """Approximate peak memory of one period-search worker for n photons."""
+    # Photon times, plus the float64 phases and up to four live complex128
+    # arrays (while base is built, then base and the old and new harmonic)
+    # of one trials x photons block
+    return 8 * n + 72 * trials_per_task * min(n, SEARCH_PHOTON_BLOCK)
+
+
+def _init_search_worker(dt):
+    global _SEARCH_DT
+    _SEARCH_DT = dt
+
+
+def _harmonic_powers(task):
+    """Per-harmonic power |Σ exp(2πikφ)|² for a block of trial frequencies."""
+    freqs, fdot, nharm = task
+    dt = _SEARCH_DT
+    sums = np.zeros((len(freqs), nharm), dtype=np.complex128)
+    for start in range(0, len(dt), SEARCH_PHOTON_BLOCK):
+        block = dt[start:start + SEARCH_PHOTON_BLOCK]
+        phase = freqs[:, None] * block[None, :] + 0.5 * fdot * block[None, :] ** 2
+        base = np.exp(2j * np.pi * phase)
+        z = base
+        for k in range(nharm):
+            if k:
+                z = z * base
+            sums[:, k] += z.sum(axis=1)
+    return np.abs(sums) ** 2
+
+
+def period_search(times, t0, period, nharm=2, span=1e-3, oversample=5,
+                  pdots=(0.0,), processes=None, trials_per_task=64):
+    """Z²ₘ and H-test periodogram over trial periods (and Ṗ) around period.
+
+    Phases follow gen_script, φ = (MJD - T0)/P, extended with the Ṗ term
+    -½ Ṗ/P² (MJD - T0)². Trial frequencies span ±span around 1/P with
+    spacing 1/(oversample × T), where T is the photon baseline. Blocks of
+    trials are spread over a process pool of min(SEARCH_MAX_PROCESSES, cores)
+    workers unless processes is given. Photons are summed in blocks of
+    SEARCH_PHOTON_BLOCK, so a worker needs 8 bytes per photon plus about
+    72 × trials_per_task × SEARCH_PHOTON_BLOCK bytes (~75 MB at the default 64
+    trials), see search_worker_bytes.
+    """
+    dt = met_to_mjd(np.asarray(times, dtype=np.float64)) - t0
+    n = len(dt)
+    if n == 0:
+        raise ValueError("No photons to search")
+    baseline = dt.max() - dt.min()
+    f0 = 1.0 / period
+    df = 1.0 / (oversample * baseline)
+    freqs = np.arange(f0 * (1 - span), f0 * (1 + span) + df, df)
+    pdots = np.atleast_1d(np.asarray(pdots, dtype=np.float64))
+
+    tasks = [(freqs[i:i + trials_per_task], -pdot * f0 ** 2, nharm)
+             for pdot in pdots for i in range(0, len(freqs), trials_per_task)]
+    if processes is None:
+        processes = min(SEARCH_MAX_PROCESSES, os.cpu_count() or 1)
+    # spawn keeps the workers clear of the GUI's threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                             initializer=_init_search_worker, initargs=(dt,)) as pool:
+        powers = np.concatenate(list(pool.map(_harmonic_powers, tasks)))
+
+    z2_all = 2.0 / n * np.cumsum(powers, axis=1)
+    z2 = z2_all[:, -1].reshape(len(pdots), len(freqs))
+    h = (z2_all - 4 * np.arange(1, nharm + 1) + 4).max(axis=1).reshape(len(pdots), len(freqs))
+    best = np.unravel_index(np.argmax(z2), z2.shape)
+    return {
+        "periods": 1.0 / freqs,
+        "pdots": pdots,
+        "z2": z2,
+        "h": h,
+        "nharm": nharm,
+        "n": n,
+        "best_period": float(1.0 / freqs[best[1]]),
+        "best_pdot": float(pdots[best[0]]),
+        "best_z2": float(z2[best]),
+        "best_h": float(h[best]),
+    }
+
+
+def plot_periodogram(result, path, title=""):
+    """Saves the Z²ₘ periodogram at the best Ṗ."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    row = int(np.argmax(result["pdots"] == result["best_pdot"]))
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.plot(result["periods"], result["z2"][row], "k", lw=0.8)
+    ax.axvline(result["best_period"], color="red", linestyle="--")
+    ax.set_xlabel("Period (Days)")
+    ax.set_ylabel(f"Z²$_{{{result['nharm']}}}$")
+    ax.set_title(f"{title}  P={result['best_period']:.7f} d  Ṗ={result['best_pdot']:.2e}  "
+                 f"Z²={result['best_z2']:.1f}  H={result['best_h']:.1f}")
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
+def phase_livetime(sc_file, t0, period, phase_bins, tmin, tmax):
+    """LIVETIME (s) per phase bin, binning each spacecraft interval by its midpoint."""
+    with fits.open(sc_file, memmap=True) as hdul:
+        sc = hdul["SC_DATA"].data
+        start, stop = np.asarray(sc["START"]), np.asarray(sc["STOP"])
+        livetime = np.asarray(sc["LIVETIME"])
+    keep = (start >= tmin) & (stop <= tmax)
+    mid = 0.5 * (start[keep] + stop[keep])
+    idx = phase_bin_index(fold_phase(mid, t0, period), phase_bins)
+    return np.bincount(idx, weights=livetime[keep], minlength=phase_bins)
+
+
+def parse_energy_bands(text):
+    """'100-1000, 1000-10000' → [(100.0, 1000.0), (1000.0, 10000.0)]."""
+    bands = []
+    for item in text.split(","):
+        if item.strip():
+            lo, hi = item.split("-")
+            bands.append((float(lo), float(hi)))
+    return bands
+
+
+def weighted_light_curve(event_file, weight_column, t0, period, phase_bins,
+                         ra, dec, rad, tmin, tmax, emin, emax, bands=(), sc_file=None):
+    """Phase-binned light curves from per-photon source probabilities.
+
+    One pass accumulates Σw and Σw² per (band, phase bin); band 0 is the full
+    Min/Max Energy range and the requested bands follow. The rate is Σw over
+    the bin's livetime when a spacecraft file is given, otherwise Σw itself.
+    Errors are √Σw² and the "ts" column is the weighted significance
+    (Σw)²/Σw². Returns one DataFrame per band in the fluxes.csv layout, except
+    that the flux columns are named after their unit: rate_cts_per_s with a
+    spacecraft file, weighted_counts without. Neither is a ph/cm²/s flux.
+    """
+    bands = [(emin, emax)] + list(bands)
+    edges_lo = np.array([b[0] for b in bands])
+    edges_hi = np.array([b[1] for b in bands])
+    sum_w = np.zeros((len(bands), phase_bins))
+    sum_w2 = np.zeros((len(bands), phase_bins))
+
+    for chunk in iter_event_chunks(event_file, SELECTION_COLUMNS + [weight_column],
+                                   cone=(ra, dec, rad), window=(tmin, tmax)):
+        keep = select_events(chunk, ra, dec, rad, tmin, tmax, emin, emax)
+        idx = phase_bin_index(fold_phase(chunk["TIME"][keep], t0, period), phase_bins)
+        energy = chunk["ENERGY"][keep]
+        weight = chunk[weight_column][keep].astype(np.float64)
+        in_band = (energy[None, :] >= edges_lo[:, None]) & (energy[None, :] < edges_hi[:, None])
+        in_band[0] = True
+        for b in range(len(bands)):
+            sel = in_band[b]
+            sum_w[b] += np.bincount(idx[sel], weights=weight[sel], minlength=phase_bins)
+            sum_w2[b] += np.bincount(idx[sel], weights=weight[sel] ** 2, minlength=phase_bins)
+
+    exposure = np.ones(phase_bins)
+    if sc_file:
+        exposure = phase_livetime(sc_file, t0, period, phase_bins, tmin, tmax)
+
+    phase = np.arange(phase_bins) / phase_bins
+    phase = np.append(phase, phase + 1)
+    value = "rate_cts_per_s" if sc_file else "weighted_counts"
+    curves = []
+    for b, (lo, hi) in enumerate(bands):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            flux = sum_w[b] / exposure
+            flux_err = np.sqrt(sum_w2[b]) / exposure
+            ts = np.where(sum_w2[b] > 0, sum_w[b] ** 2 / sum_w2[b], 0.0)
+        df = pd.DataFrame({
+            "phase": phase,
+            "phase_hw": np.full_like(phase, 1.0 / (2 * phase_bins)),
+            value: np.append(flux, flux),
+            value + "_err": np.append(flux_err, flux_err),
+            "ts": np.append(ts, ts),
+        })
+        for i in range(5):
+            df[f"par_{i}"] = np.nan
+            df[f"par_{i}_err"] = np.nan
+        curves.append(((lo, hi), df))
+    return curves
+
+
+def plot_phaseogram(result, path, title=""):
+    """Saves a two-cycle phaseogram with the test statistics in the title."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    counts, edges = result["counts"], result["edges"]
+    phase = np.append(edges[:-1], edges[:-1] + 1)
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.step(phase, np.append(counts, counts), "k", where="post")
+    ax.errorbar(phase + 0.5 / len(counts), np.append(counts, counts),
+                yerr=np.sqrt(np.append(counts, counts)), fmt="k+")
+    ax.set_xlim(0, 2)
+    ax.axvline(1, color="gray", linestyle="--")
+    ax.set_xlabel("Phase")
+    ax.set_ylabel("Counts")
+    ax.set_title(f"{title}  N={result['n']}  Z²₂={result['z2_2']:.1f}  "
+                 f"H={result['h']:.1f} (m={result['h_m']}, p={result['h_prob']:.2g})")
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+    return path
 
 # =============================================================================
 # Beyond this point is all Fermi analysis and scripting
@@ -182,8 +1932,6 @@ class FermiScriptGenerator(QWidget):
 
 
 
-    CONFIG = load_config()
-
     def __init__(self,config):
         super().__init__()
         self.config = config
@@ -280,10 +2028,25 @@ class FermiScriptGenerator(QWidget):
         self.create_input(layout, "Min Energy (MeV)", "100")
         self.create_input(layout, "Max Energy (MeV)", "100000")
         self.create_input(layout, "Number of Energy Bins", "14")
+        self.create_input(layout, "Pixel Size (Deg)", "0.1")
+        self.create_input(layout, "Low-Energy Pixel (Deg)", "")
+        self.create_input(layout, "Pixel Split Energy (MeV)", "1000")
+        self.create_input(layout, "Energy Bands (MeV)", "")
+        self.create_input(layout, "Weight Column", "")
 
         self.create_input(layout, "Partition", "large-gpu")
         self.create_input(layout, "Cores", "8")
         self.create_input(layout, "Runtime", "8:00:00")
+        self.create_input(layout, "Phases per Batch", "")
+        self.create_input(layout, "Intermediate Files", "keep")
+        self.create_input(layout, "Fit Strategy", "full")
+        self.create_input(layout, "SED Min TS", "")
+        self.create_input(layout, "Phase Sub-bins", "")
+        # Sub-bins always go through the product store, whatever the reuse toggle says
+        self.fields["Phase Sub-bins"].setPlaceholderText("Blank = off; stored in .fp_store")
+        self.fields["Phase Sub-bins"].setToolTip(
+            "Sub-bin event lists are kept in <Remote Directory>/.fp_store even when "
+            "Reuse Matching Reduction Products is off. Delete .fp_store to reclaim the space.")
 
 
 
@@ -318,11 +2081,77 @@ class FermiScriptGenerator(QWidget):
         self.upload_toggle = QCheckBox("Send Scripts to Cluster after Generation")
         self.upload_toggle.setStyleSheet("color: #FFD700;")  # Yellow text
         layout.addWidget(self.upload_toggle)
+        self.monitor_toggle = QCheckBox("Monitor Jobs after Submission")
+        self.monitor_toggle.setStyleSheet("color: #FFD700;")  # Yellow text
+        layout.addWidget(self.monitor_toggle)
+        self.manifest_toggle = QCheckBox("Upload a Run Manifest and Expand Scripts on the Cluster (Basic)")
+        self.manifest_toggle.setStyleSheet("color: #FFD700;")  # Yellow text
+        layout.addWidget(self.manifest_toggle)
+        self.cost_order_toggle = QCheckBox("Queue Largest Phases First (reads Event File locally)")
+        self.cost_order_toggle.setStyleSheet("color: #FFD700;")  # Yellow text
+        layout.addWidget(self.cost_order_toggle)
+        self.event_cache_toggle = QCheckBox("Cache Event Columns for Local Tools (<Event File>.fpcache)")
+        self.event_cache_toggle.setStyleSheet("color: #FFD700;")  # Yellow text
+        layout.addWidget(self.event_cache_toggle)
+        self.event_index_toggle = QCheckBox("Index Cached Events by Sky Pixel and Time (<Event File>.fpindex)")
+        self.event_index_toggle.setStyleSheet("color: #FFD700;")  # Yellow text
+        layout.addWidget(self.event_index_toggle)
+        self.metrics_toggle = QCheckBox("Record Per-Tool Metrics (time, CPU, memory, I/O)")
+        self.metrics_toggle.setStyleSheet("color: #FFD700;")  # Yellow text
+        layout.addWidget(self.metrics_toggle)
+        self.reuse_toggle = QCheckBox("Reuse Matching Reduction Products (FT1, ccube, ltcube)")
+        self.reuse_toggle.setStyleSheet("color: #FFD700;")  # Yellow text
+        layout.addWidget(self.reuse_toggle)
+        self.defer_sed_toggle = QCheckBox("Defer SEDs to a Follow-up Job")
+        self.defer_sed_toggle.setStyleSheet("color: #FFD700;")  # Yellow text
+        layout.addWidget(self.defer_sed_toggle)
+        self.band_grid_toggle = QCheckBox("Fit Each Energy Band per Phase (Energy Bands field, Basic)")
+        self.band_grid_toggle.setStyleSheet("color: #FFD700;")  # Yellow text
+        layout.addWidget(self.band_grid_toggle)
+        self.joint_fit_toggle = QCheckBox("Fit All Phases Jointly (shared background)")
+        self.joint_fit_toggle.setStyleSheet("color: #FFD700;")  # Yellow text
+        layout.addWidget(self.joint_fit_toggle)
+        self.escalate_runtime_toggle = QCheckBox("Escalate Runtime when Resubmitting Failed Phases")
+        self.escalate_runtime_toggle.setStyleSheet("color: #FFD700;")  # Yellow text
+        layout.addWidget(self.escalate_runtime_toggle)
         self.generate_button = QPushButton("Generate Scripts")
         self.generate_button.setStyleSheet("background-color: #FF8C00; color: white;")
         self.generate_button.clicked.connect(self.generate_scripts)
         layout.addWidget(self.generate_button)
 
+        # Cluster/result tools
+        tools_layout = QHBoxLayout()
+        self.harvest_button = QPushButton("Harvest Results")
+        self.harvest_button.setStyleSheet("background-color: #3A3D66; color: white;")
+        self.harvest_button.clicked.connect(self.harvest)
+        tools_layout.addWidget(self.harvest_button)
+        self.ccube_button = QPushButton("Quick-Look Counts Cubes")
+        self.ccube_button.setStyleSheet("background-color: #3A3D66; color: white;")
+        self.ccube_button.clicked.connect(self.quicklook_ccubes)
+        tools_layout.addWidget(self.ccube_button)
+        self.phaseogram_button = QPushButton("Quick-Look Phaseogram")
+        self.phaseogram_button.setStyleSheet("background-color: #3A3D66; color: white;")
+        self.phaseogram_button.clicked.connect(self.quicklook_phaseogram)
+        tools_layout.addWidget(self.phaseogram_button)
+        self.period_search_button = QPushButton("Period Search")
+        self.period_search_button.setStyleSheet("background-color: #3A3D66; color: white;")
+        self.period_search_button.clicked.connect(self.search_period)
+        tools_layout.addWidget(self.period_search_button)
+        self.weighted_lc_button = QPushButton("Weighted Light Curve")
+        self.weighted_lc_button.setStyleSheet("background-color: #3A3D66; color: white;")
+        self.weighted_lc_button.clicked.connect(self.weighted_lightcurve)
+        tools_layout.addWidget(self.weighted_lc_button)
+        self.sed_button = QPushButton("Run Deferred SEDs")
+        self.sed_button.setStyleSheet("background-color: #3A3D66; color: white;")
+        self.sed_button.clicked.connect(self.run_deferred_seds)
+        tools_layout.addWidget(self.sed_button)
+        self.resubmit_button = QPushButton("Resubmit Failed Phases")
+        self.resubmit_button.setStyleSheet("background-color: #3A3D66; color: white;")
+        self.resubmit_button.clicked.connect(self.resubmit_failed)
+        tools_layout.addWidget(self.resubmit_button)
+        layout.addLayout(tools_layout)
+        self.tools_layout = tools_layout
+
         # Status output
         self.status_text = QTextEdit()
         self.status_text.setReadOnly(True)
@@ -331,6 +2160,15 @@ class FermiScriptGenerator(QWidget):
 
         self.setLayout(layout)
 
+        # Monitor threads report through this bridge so Qt stays responsive
+        self.status_bridge = StatusBridge()
+        self.status_bridge.message.connect(self.status_text.append)
+        self.status_bridge.image.connect(self.show_image)
+        self.image_windows = []
+        self.monitor_threads = []
+        # Set by resubmit_failed while it regenerates a subset of the phases
+        self.resubmit = None
+
         # Load previous settings in a .JSON format
         self.load_settings()
 
@@ -517,15 +2355,171 @@ class FermiScriptGenerator(QWidget):
             self.fields[key].setText("")
         self.status_text.append("Settings reset.")
 
+    @traced("parse_settings", "parse")
     def parse_float_list(self, field_name):
         raw = self.fields[field_name].text()
-        print(f"DEBUG: Raw input for {field_name!r} → {repr(raw)}")
         return [float(x.strip()) for x in raw.split(',')]
 
+    @traced("cube_geometry", "compute")
+    def cube_settings(self, rad, emin, emax, ebins):
+        """Cube geometry from the ROI fields, reporting its memory footprint."""
+        binsz = float(self.fields["Pixel Size (Deg)"].text() or 0.1)
+        low_binsz = self.fields["Low-Energy Pixel (Deg)"].text().strip()
+        split = self.fields["Pixel Split Energy (MeV)"].text().strip()
+        geometry = cube_geometry(rad, emin, emax, ebins, binsz,
+                                 float(low_binsz) if low_binsz else None,
+                                 float(split) if split else None)
+        for k, c in enumerate(geometry):
+            self.status_text.append(
+                f"Cube {k:02d}: {c['npix']}×{c['npix']} px at {c['binsz']}° "
+                f"({c['roiwidth']:.2f}° wide), {c['enumbins']} energy bins "
+                f"{c['emin']:g}–{c['emax']:g} MeV"
+            )
+        ccube, srcmap = cube_footprint(geometry)
+        self.status_text.append(
+            f"Counts cube {ccube / 1e6:.1f} MB per phase; source maps ≈ {srcmap / 1e6:.1f} MB per model source"
+        )
+        return geometry
+
+    def gen_ccubes(self, gtbin, phase, sc_file, ra, dec, geometry):
+        """One gtbin call per binning component."""
+        return "\n\n".join(
+            self.tool("gtbin", gtbin(phase, sc_file, c["emin"], c["emax"], c["enumbins"],
+                                     ra, dec, npix=c["npix"], binsz=c["binsz"], suffix=f"{k:02d}"))
+            for k, c in enumerate(geometry)
+        )
+
+    def gen_component_links(self, geometry):
+        # Components share the ROI selection; fermipy looks for ft1_0k
+        return "\n".join(f"ln -sf ft1_00.fits ft1_{k:02d}.fits" for k in range(1, len(geometry)))
+
+    @traced("render_reduction", "render")
+    def gen_reduction(self, ft1_commands, ccube_commands, ltcube_command, geometry,
+                      ft1_inputs="${PHASE}.fits", bands=()):
+        """FT1 selection, counts cubes and livetime cube for one phase.
+
+        Each product's reuse key chains the commands of everything upstream
+        of it, so a ccube is only reused on top of the FT1 it was built from.
+        ft1_inputs are the phase-filtered files gtselect reads. bands holds
+        (ccube commands, geometry) per energy band; each band only bins the
+        shared FT1 into band_<b>/, the livetime cube is energy independent.
+        """
+        ft1_text = "\n\n".join(ft1_commands)
+        ccubes = [f"ccube_{k:02d}.fits" for k in range(len(geometry))]
+        blocks = [
+            self.reuse(ft1_text, ft1_text, ["ft1_00.fits"]),
+            # The phase-filtered event list is only read by gtselect
+            f"fp_disk\nfp_retire {ft1_inputs}",
+            self.gen_component_links(geometry),
+            self.reuse(ft1_text + ccube_commands, ccube_commands, ccubes),
+            "fp_disk",
+            self.reuse(ft1_text + ltcube_command, ltcube_command, ["ltcube_00.fits"]),
+        ]
+        for b, (band_commands, band_geometry) in enumerate(bands, 1):
+            band_ccubes = [f"ccube_{k:02d}.fits" for k in range(len(band_geometry))]
+            blocks += [
+                f"mkdir -p band_{b}\ncd band_{b}\nln -sf ../ft1_00.fits ft1_00.fits",
+                self.gen_component_links(band_geometry),
+                self.reuse(ft1_text + band_commands, band_commands, band_ccubes),
+                "cd ..",
+            ]
+        return "\n\n".join(b for b in blocks if b)
+
+    def reuse(self, key_text, commands, products, shift="${SHIFT}", force=False):
+        """Skips commands when the store already holds products for this key."""
+        if not (self.reuse_toggle.isChecked() or force):
+            return commands
+        # Instrumentation does not change a product, so it stays out of the key
+        digest = hashlib.sha256(re.sub(r"fp_(?:measure|run) \S+ ", "", key_text).encode()).hexdigest()[:16]
+        files = " ".join(products)
+        # The key is recomputed rather than held in a variable, as blocks can nest
+        key = f"$(fp_key {digest} {shift})"
+        return f"""if ! fp_restore {key} {files}; then
+
+{commands}
+
+fp_store {key} {files}
+fi"""
+
+    @traced("write_manifest", "io")
+    def write_manifest(self, local_dir, working_dir, mode, template, phase_chunks, cores):
+        """Writes manifest.json and the expander in place of the phase-batch scripts."""
+        files = {}
+        names = ["config.yaml", "analyze_phases.py"] + sorted(
+            os.path.basename(p) for p in glob.glob(os.path.join(local_dir, "config_band_*.yaml")))
+        for name in names:
+            with open(os.path.join(local_dir, name), "r") as f:
+                files[name] = f.read()
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "mode": mode,
+            "run_dir": working_dir,
+            "settings": {key: entry.text() for key, entry in self.fields.items()},
+            "setup": {"paths": self.config["paths"], "env": self.config["env"]},
+            "files": files,
+            "batch_template": template,
+            "batches": [{"batch": b, "phase": b * cores, "phases": list(group)}
+                        for b, group in enumerate(phase_chunks)],
+        }
+        path = os.path.join(local_dir, "manifest.json")
+        with open(path, "w") as f:
+            json.dump(manifest, f, indent=1)
+        with open(os.path.join(local_dir, "fp_expand.py"), "w") as f:
+            f.write(MANIFEST_EXPANDER)
+        self.status_text.append(f"Run manifest written: {path} ({len(phase_chunks)} batches, "
+                                f"{os.path.getsize(path) / 1024:.0f} KB)")
+        return path
+
+    def phases_per_batch(self, cores):
+        """Phases queued per batch job; defaults to one per core."""
+        raw = self.fields["Phases per Batch"].text().strip()
+        return max(int(raw), 1) if raw else cores
+
+    def event_cache_mode(self):
+        """"index", "cache" or None; read on the GUI thread only."""
+        if self.event_index_toggle.isChecked():
+            return "index"
+        if self.event_cache_toggle.isChecked():
+            return "cache"
+        return None
+
+    def cache_events(self, event_file, extra_columns=()):
+        """Builds or refreshes the columnar event cache and index when enabled."""
+        prepare_event_cache(event_file, self.event_cache_mode(), extra_columns)
+
+    def phase_costs(self, event_file, ra, dec, rad, t0, period, phase_bins,
+                    tmin, tmax, emin, emax):
+        """Photon counts per phase bin, or None when the Event File is not local."""
+        if not os.path.exists(event_file):
+            self.status_text.append("⚠️ Event File not found locally, keeping phases in order.")
+            return None
+        self.cache_events(event_file)
+        costs = estimate_phase_costs(event_file, ra, dec, rad, t0, period,
+                                     phase_bins, tmin, tmax, emin, emax)
+        self.status_text.append(f"Phase costs (ROI photons): min {costs.min()}, max {costs.max()}")
+        return costs
+
     def generate_scripts(self):
+        """Traced Generate click: builds (and uploads) the scripts, then reports timings."""
+        TRACER.reset()
+        try:
+            with TRACER.span("generate_scripts", "gui", mode=self.mode_switch.currentText()):
+                self.build_scripts()
+        finally:
+            self.report_trace()
+
+    def report_trace(self):
+        """Summarizes the last click in the status window and saves fp_trace.json."""
+        for line in TRACER.summary():
+            self.status_text.append(line)
+        local_dir = self.fields["Local Directory"].text().strip()
+        if local_dir and os.path.isdir(local_dir):
+            path = TRACER.export(os.path.join(local_dir, "fp_trace.json"))
+            self.status_text.append(f"Trace saved → {path} (open in chrome://tracing or Perfetto)")
+
+    def build_scripts(self):
         """Needs mode updates"""
         mode = self.mode_switch.currentText()
-        print(mode)
         """Generates the scripts and saves them in the selected Remote Directory."""
         working_dir = self.fields["Remote Directory"].text().strip()
         local_dir = self.fields["Local Directory"].text().strip()
@@ -539,7 +2533,22 @@ class FermiScriptGenerator(QWidget):
             self.status_text.append("⚠️ Error: No remote directory selected!")
             return
 
+        manifest_path = None
+        # Phase bins of the generated run, for the monitor; Adaptive has none fixed
+        monitor_bins = None
+        use_manifest = self.manifest_toggle.isChecked() and mode == "Basic" and not self.resubmit
+        if self.manifest_toggle.isChecked() and not use_manifest:
+            self.status_text.append("⚠️ Run manifests support Basic mode only; writing full scripts.")
+        if self.band_grid_toggle.isChecked() and mode != "Basic":
+            self.status_text.append("⚠️ The energy-band grid applies to Basic mode only; fitting the full range.")
+        if self.fields["Phase Sub-bins"].text().strip() and mode != "Basic":
+            self.status_text.append("⚠️ Phase Sub-bins apply to Basic mode only; filtering each phase directly.")
+        elif self.fields["Phase Sub-bins"].text().strip() and not self.reuse_toggle.isChecked():
+            self.status_text.append("⚠️ Phase Sub-bins keep their event lists in <Remote Directory>/.fp_store "
+                                    "although reuse is off; delete .fp_store to reclaim the space.")
         try:
+            if not self.preflight(mode):
+                return
             os.makedirs(local_dir, exist_ok=True)
 
             # Read user input values
@@ -559,6 +2568,13 @@ class FermiScriptGenerator(QWidget):
 
             CORES = int(self.fields["Cores"].text())
             RUNTIME = self.fields["Runtime"].text()
+            if self.resubmit:
+                RUNTIME = self.resubmit["runtime"]
+            geometry = self.cube_settings(rad, emin, emax, ebins)
+            intermediates = self.lifecycle_mode()
+            fit_strategy = self.fit_settings()
+            sed_settings = self.sed_settings()
+            joint_fit = self.joint_fit_settings()
 
 
 
@@ -568,26 +2584,62 @@ class FermiScriptGenerator(QWidget):
                 phase_bins = int(self.fields["Number of Phase Bins"].text())
                 tmin = float(self.fields["Min Time (MET)"].text())
                 tmax = float(self.fields["Max Time (MET)"].text())
-
-                for sh_file in glob.glob(os.path.join(local_dir, "*.sh")):
+                monitor_bins = phase_bins
+                subbins = self.phase_subbins(phase_bins)
+                bands = self.band_grid(rad, emin, emax, ebins)
+                if bands and joint_fit["enabled"]:
+                    raise ValueError("The energy-band grid cannot be combined with the joint fit")
+
+                for sh_file in glob.glob(os.path.join(local_dir, "*.sh")) + \
+                        glob.glob(os.path.join(local_dir, "config_band_*.yaml")):
                     os.remove(sh_file)
 
+                if subbins:
+                    ft1_commands = [
+                        self.gen_phase_subbins(phase_bins, subbins, t0, period, event_file, sc_file),
+                        self.tool("gtselect", self.gtselect_script(0, ra, dec, rad, tmin, tmax, emin, emax,
+                                                                   infile="@subbins.txt"))]
+                    ft1_inputs = "sub_*.fits subbins.txt"
+                else:
+                    ft1_commands = [
+                        self.tool("gtmktime", self.gen_script(0, phase_bins, ra, dec, t0, period, event_file, sc_file)),
+                        self.tool("gtselect", self.gtselect_script(0, ra, dec, rad, tmin, tmax, emin, emax))]
+                    ft1_inputs = "${PHASE}.fits"
+
                 phases = list(range(1, phase_bins + 1))
-                phase_chunks = [phases[i:i+CORES] for i in range(0, len(phases), CORES)]
+                analysis_phases = None
+                if self.resubmit:
+                    phases = self.resubmit["phases"]
+                    # The joint fit shares one background, so it always refits every phase
+                    if not joint_fit["enabled"]:
+                        analysis_phases = phases
+                costs = None
+                if self.cost_order_toggle.isChecked():
+                    costs = self.phase_costs(event_file, ra, dec, rad, t0, period,
+                                             phase_bins, tmin, tmax, emin, emax)
+                phase_chunks = plan_phase_batches(phases, self.phases_per_batch(CORES), costs)
+
+                def batch_block(i, phase_group, placeholders=False):
+                    return "\n\n".join([
+                            self.gen_header(i, working_dir, phase_bins,CORES,RUNTIME,self.FERMI_MAKE_DIR,PARTITION,self.CLUSTER_SCRIPT_PATH,self.FermiPyFermiTools_Installation,self.gen_shell_functions(working_dir, [event_file, sc_file], store=bool(subbins))),
+                            self.gen_reduction(
+                                ft1_commands,
+                                self.gen_ccubes(self.gtbin_script, i, sc_file, ra, dec, geometry),
+                                self.tool("gtltcube", self.gtltcube_script(i, sc_file, tmin, tmax)),
+                                geometry, ft1_inputs=ft1_inputs,
+                                bands=[(self.gen_ccubes(self.gtbin_script, i, sc_file, ra, dec, band["geometry"]),
+                                        band["geometry"]) for band in bands]),
+                            self.gen_closer(phase_bins,working_dir, i,CORES,RUNTIME,PARTITION,self.FERMI_MAKE_DIR,self.email,self.CLUSTER_SCRIPT_PATH,self.FermiPyFermiTools_Installation, phase_queue=phase_group, placeholders=placeholders,
+                                            analysis_phases=analysis_phases)
+                        ]) + "\n\nwait\n"
 
                 for chunk_id, phase_group in enumerate(phase_chunks):
 
                         script_blocks = []
 
                         i = chunk_id
-                        block = "\n\n".join([
-                            self.gen_header(i, working_dir, phase_bins,CORES,RUNTIME,self.FERMI_MAKE_DIR,PARTITION,self.CLUSTER_SCRIPT_PATH,self.FermiPyFermiTools_Installation),
-                            self.gen_script(i, phase_bins, ra, dec, t0, period, event_file, sc_file),
-                            self.gtselect_script(i, ra, dec, rad, tmin, tmax, emin, emax),
-                            self.gtbin_script(i, sc_file, emin, emax, ebins, ra, dec),
-                            self.gtltcube_script(i, sc_file, tmin, tmax),
-                            self.gen_closer(phase_bins,working_dir, i,CORES,RUNTIME,PARTITION,self.FERMI_MAKE_DIR,self.email,self.CLUSTER_SCRIPT_PATH,self.FermiPyFermiTools_Installation)
-                        ])
+                        with TRACER.span("render_batch", "render", batch=i):
+                            block = batch_block(i, phase_group)
 
                         # run each phase in background
                         # block += " &\n"
@@ -598,21 +2650,42 @@ class FermiScriptGenerator(QWidget):
                             i, local_dir, event_file, sc_file,
                             ra, dec, rad, tmin, tmax, emin, emax, ebins,
                             self.CLUSTER_ISODIFF_PATH, self.CLUSTER_GALDIFF_PATH,
-                            self.CLUSTER_CAT_PATH, self.CLUSTER_EXT_CAT_PATH
+                            self.CLUSTER_CAT_PATH, self.CLUSTER_EXT_CAT_PATH,
+                            geometry=geometry
                         )
-
-                        self.generate_analysis_script(i, local_dir, working_dir, phase_bins,SRCNAME,self.CLUSTER_EXT_CAT_PATH)
-
-                        # wait for all background jobs in this chunk
-                        script_blocks.append("wait\n")
+                        for b, band in enumerate(bands, 1):
+                            self.generate_config(
+                                i, local_dir, event_file, sc_file,
+                                ra, dec, rad, tmin, tmax, band["emin"], band["emax"], band["enumbins"],
+                                self.CLUSTER_ISODIFF_PATH, self.CLUSTER_GALDIFF_PATH,
+                                self.CLUSTER_CAT_PATH, self.CLUSTER_EXT_CAT_PATH,
+                                geometry=band["geometry"], band=b
+                            )
+
+                        self.generate_analysis_script(i, local_dir, working_dir, phase_bins,SRCNAME,self.CLUSTER_EXT_CAT_PATH,
+                                                      instrument=self.metrics_toggle.isChecked(),
+                                                      intermediates=intermediates,
+                                                      fit_strategy=fit_strategy,
+                                                      sed_settings=sed_settings,
+                                                      joint_fit=joint_fit,
+                                                      energy_bands=[(band["emin"], band["emax"]) for band in bands])
+
+                        if use_manifest:
+                            continue
 
                         script_content = "\n".join(script_blocks)
 
                         script_path = os.path.join(local_dir, f"phase_batch_{chunk_id}.sh")
 
-                        with open(script_path, "w") as f:
+                        with TRACER.span("write_script", "io", file=os.path.basename(script_path)), \
+                                open(script_path, "w") as f:
                             f.write(script_content)
 
+                if use_manifest:
+                    manifest_path = self.write_manifest(local_dir, working_dir, mode,
+                                                        batch_block(0, [], placeholders=True),
+                                                        phase_chunks, CORES)
+
 
 
             if mode == "Adaptive (Fixed Counts) Binning - NOTE: Wait times may vary":
@@ -637,12 +2710,12 @@ class FermiScriptGenerator(QWidget):
 
                     os.makedirs(local_dir, exist_ok=True)
 
-                    # --- Load the FITS data ---
-                    with fits.open(event_file) as hdul:
-                        data = hdul[1].data
-                        pulse_phase = data["PULSE_PHASE"][
-                            (data["ENERGY"] > emin) & (data["ENERGY"] < emax)
-                        ]
+                    # --- Load the event phases ---
+                    self.cache_events(event_file)
+                    pulse_phase = np.concatenate([
+                        chunk["PULSE_PHASE"][(chunk["ENERGY"] > emin) & (chunk["ENERGY"] < emax)]
+                        for chunk in iter_event_chunks(event_file, ["ENERGY", "PULSE_PHASE"])
+                    ] or [np.zeros(0)])
 
                     if len(pulse_phase) < num_counts:
                         self.status_text.append("⚠️ Warning: Not enough counts for requested bin size.")
@@ -672,8 +2745,12 @@ class FermiScriptGenerator(QWidget):
                     # --- Generate scripts per adaptive bin ---
                     for i, (pmin, pmax) in enumerate(zip(bin_edges[:-1], bin_edges[1:]), start=1):
                         script_content = "\n\n".join([
-                            self.gen_header(i, working_dir, phase_bins,CORES,RUNTIME,self.FERMI_MAKE_DIR,PARTITION,self.CLUSTER_SCRIPT_PATH,self.FermiPyFermiTools_Installation),
-                            self.gtselect_script_adaptive(i, event_file_dir, ra, dec, rad, tmin, tmax, emin, emax, pmin, pmax),
+                            self.gen_header(i, working_dir, phase_bins,CORES,RUNTIME,self.FERMI_MAKE_DIR,PARTITION,self.CLUSTER_SCRIPT_PATH,self.FermiPyFermiTools_Installation,self.gen_shell_functions(working_dir, [event_file_dir, sc_file])),
+                            self.gen_reduction(
+                                [self.tool("gtselect", self.gtselect_script_adaptive(i, event_file_dir, ra, dec, rad, tmin, tmax, emin, emax, pmin, pmax))],
+                                self.gen_ccubes(self.gtbin_script, i, sc_file, ra, dec, geometry),
+                                self.tool("gtltcube", self.gtltcube_script(i, sc_file, tmin, tmax)),
+                                geometry),
 
 #                             f"""gtselect infile={event_file} outfile=./ft1_00.fits \
 # ra={ra} dec={dec} rad={rad} \
@@ -681,8 +2758,6 @@ class FermiScriptGenerator(QWidget):
 # phasemin={pmin:.6f} phasemax={pmax:.6f} \
 # zmin=0.0 zmax=90.0 evclass=128 evtype=3 convtype=-1 \
 # evtable="EVENTS" chatter=3 clobber=yes debug=no gui=no mode="ql" """,
-                            self.gtbin_script(i, sc_file, emin, emax, ebins, ra, dec),
-                            self.gtltcube_script(i, sc_file, tmin, tmax),
                             self.gen_closer(phase_bins,working_dir, i,CORES,RUNTIME,PARTITION,self.FERMI_MAKE_DIR,self.email,self.CLUSTER_SCRIPT_PATH,self.FermiPyFermiTools_Installation),
                         ])
 
@@ -706,7 +2781,8 @@ class FermiScriptGenerator(QWidget):
                         # phase_dir = os.path.join(local_dir, f"{i}")
                         # os.makedirs(phase_dir, exist_ok=True)
                         # script_path = os.path.join(phase_dir, f"phase_{i}.sh")
-                        with open(script_path, "w") as f:
+                        with TRACER.span("write_script", "io", file=os.path.basename(script_path)), \
+                                open(script_path, "w") as f:
                             f.write(script_content)
 
                     self.status_text.append(
@@ -716,7 +2792,7 @@ class FermiScriptGenerator(QWidget):
                     # Optional: Upload if toggle enabled
                     if self.upload_toggle.isChecked():
                         self.status_text.append("Uploading adaptive scripts to cluster...")
-                        scp_transfer(local_dir, working_dir,config)
+                        scp_transfer(local_dir, working_dir,self.config)
 
                 except Exception as e:
                     self.status_text.append(f"Adaptive binning error: {e}")
@@ -726,6 +2802,7 @@ class FermiScriptGenerator(QWidget):
 
             if mode == "Joint Epoch Fitting":
                 phase_bins = int(self.fields["Number of Phase Bins"].text())
+                monitor_bins = phase_bins
 
                 tmins   = list(map(float, self.fields["Min Time (MET)"].text().split(',')))
                 tmaxs   = list(map(float, self.fields["Max Time (MET)"].text().split(',')))
@@ -741,7 +2818,7 @@ class FermiScriptGenerator(QWidget):
                     os.remove(sh_file)
 
                 phases = list(range(1, phase_bins + 1))
-                phase_chunks = [phases[i:i+CORES] for i in range(0, len(phases), CORES)]
+                phase_chunks = plan_phase_batches(phases, self.phases_per_batch(CORES))
 
                 for chunk_id, phase_group in enumerate(phase_chunks):
 
@@ -753,23 +2830,24 @@ class FermiScriptGenerator(QWidget):
                             self.gen_header(i, working_dir, phase_bins, CORES, RUNTIME,
                                             self.FERMI_MAKE_DIR, PARTITION,
                                             self.CLUSTER_SCRIPT_PATH,
-                                            self.FermiPyFermiTools_Installation),
+                                            self.FermiPyFermiTools_Installation,
+                                            self.gen_shell_functions(working_dir, [event_file, sc_file])),
 
-                            self.gen_script_multiple(i, phase_bins, ra, dec,
+                            self.gen_reduction(
+                                [self.tool("gtmktime", self.gen_script_multiple(i, phase_bins, ra, dec,
                                                      t0s, periods, event_file, sc_file,
-                                                     tmins, tmaxs),
-
-                            self.gtselect_script_multiple(i, ra, dec, rad,
-                                                          tmins, tmaxs, emin, emax),
-
-                            self.gtbin_script_multiple(i, sc_file, emin, emax, ebins, ra, dec),
-
-                            self.gtltcube_script_multiple(i, sc_file, tmins, tmaxs),
+                                                     tmins, tmaxs)),
+                                 self.tool("gtselect", self.gtselect_script_multiple(i, ra, dec, rad,
+                                                          tmins, tmaxs, emin, emax))],
+                                self.gen_ccubes(self.gtbin_script_multiple, i, sc_file, ra, dec, geometry),
+                                self.tool("gtltcube", self.gtltcube_script_multiple(i, sc_file, tmins, tmaxs)),
+                                geometry),
 
                             self.gen_closer(phase_bins, working_dir, i, CORES, RUNTIME,
                                             PARTITION, self.FERMI_MAKE_DIR, self.email,
                                             self.CLUSTER_SCRIPT_PATH,
-                                            self.FermiPyFermiTools_Installation)
+                                            self.FermiPyFermiTools_Installation,
+                                            phase_queue=phase_group)
                         ])
 
                         # run each phase in background
@@ -782,10 +2860,16 @@ class FermiScriptGenerator(QWidget):
                             ra, dec, rad, tmins[0], tmaxs[0],  # (or pass full arrays if needed)
                             emin, emax, ebins,
                             self.CLUSTER_ISODIFF_PATH, self.CLUSTER_GALDIFF_PATH,
-                            self.CLUSTER_CAT_PATH, self.CLUSTER_EXT_CAT_PATH
+                            self.CLUSTER_CAT_PATH, self.CLUSTER_EXT_CAT_PATH,
+                            geometry=geometry
                         )
 
-                        self.generate_analysis_script(i, local_dir, working_dir, phase_bins, SRCNAME,self.CLUSTER_EXT_CAT_PATH)
+                        self.generate_analysis_script(i, local_dir, working_dir, phase_bins, SRCNAME,self.CLUSTER_EXT_CAT_PATH,
+                                                      instrument=self.metrics_toggle.isChecked(),
+                                                      intermediates=intermediates,
+                                                      fit_strategy=fit_strategy,
+                                                      sed_settings=sed_settings,
+                                                      joint_fit=joint_fit)
 
                         # wait for all jobs in chunk
                         script_blocks.append("wait\n")
@@ -794,17 +2878,351 @@ class FermiScriptGenerator(QWidget):
 
                         script_path = os.path.join(local_dir, f"phase_batch_{chunk_id}.sh")
 
-                        with open(script_path, "w") as f:
+                        with TRACER.span("write_script", "io", file=os.path.basename(script_path)), \
+                                open(script_path, "w") as f:
                             f.write(script_content)
 
                 self.status_text.append(f"Scripts successfully saved in: {local_dir}")
 
         except Exception as e:
             self.status_text.append(f"Error: {e}")
-        if self.upload_toggle.isChecked():
+            # Whatever scripts are left in the Local Directory are stale
+            return
+        if self.upload_toggle.isChecked() or self.resubmit:
             self.status_text.append("Uploading scripts to the cluster...")
             # scp_transfer()
-            scp_transfer(local_dir, working_dir,config)
+            if manifest_path:
+                job_ids = manifest_transfer(local_dir, working_dir, self.config)
+            else:
+                job_ids = scp_transfer(local_dir, working_dir,self.config, keep_flags=bool(self.resubmit))
+            if self.monitor_toggle.isChecked() and job_ids:
+                if monitor_bins is None:
+                    self.status_text.append("⚠️ Job monitoring needs a fixed Number of Phase Bins; not started.")
+                else:
+                    # One done flag per phase
+                    self.start_monitor(working_dir, job_ids, monitor_bins, monitor_bins)
+
+    def resubmit_failed(self):
+        """Regenerates and submits only the phases that failed or never finished.
+
+        Finished phases keep their done flags, so the last resubmitted batch
+        to complete submits the analysis as usual.
+        """
+        mode = self.mode_switch.currentText()
+        if mode != "Basic":
+            self.status_text.append("⚠️ Resubmitting failed phases supports Basic mode only.")
+            return
+        working_dir = self.fields["Remote Directory"].text().strip()
+        if not working_dir:
+            self.status_text.append("⚠️ Error: Remote Directory is required to resubmit!")
+            return
+        phase_bins = int(self.fields["Number of Phase Bins"].text())
+        ssh = None
+        try:
+            ssh = create_ssh_client(self.config["ssh"]["host"], self.config["ssh"]["username"],
+                                    self.config["ssh"]["key_path"])
+            done, failed, active = read_phase_status(ssh_runner(ssh), working_dir)
+        except Exception as e:
+            self.status_text.append(f"Resubmit error: {e}")
+            return
+        finally:
+            if ssh is not None:
+                ssh.close()
+
+        if active:
+            # A second run_phase would delete the directory of a live one
+            self.status_text.append(
+                "⚠️ Jobs of this run are still queued or running: "
+                + ", ".join(f"{job} ({state})" for job, state in sorted(active.items()))
+                + ". Resubmit once they have finished.")
+            return
+        todo = [p for p in range(1, phase_bins + 1) if p not in done]
+        if not todo:
+            self.status_text.append(f"All {phase_bins} phases finished; nothing to resubmit.")
+            return
+        for phase in todo:
+            if phase in failed:
+                stage, rc = failed[phase]
+                self.status_text.append(f"Phase {phase}: failed in {stage} (exit {rc})")
+            else:
+                # No flag and no live job: the batch was killed (time limit, node)
+                self.status_text.append(f"Phase {phase}: no done flag (batch killed)")
+
+        runtime = self.fields["Runtime"].text()
+        if self.escalate_runtime_toggle.isChecked():
+            factor = float(self.config.get("resubmit", {}).get("runtime_factor", 2.0))
+            runtime = scale_runtime(runtime, factor)
+        self.status_text.append(f"Resubmitting {len(todo)} of {phase_bins} phases "
+                                f"with runtime {runtime}")
+        self.resubmit = {"phases": todo, "runtime": runtime}
+        try:
+            self.generate_scripts()
+        finally:
+            self.resubmit = None
+
+    def harvest(self):
+        """Pulls phase results from the Remote Directory into the Local Directory."""
+        working_dir = self.fields["Remote Directory"].text().strip()
+        local_dir = self.fields["Local Directory"].text().strip()
+        if not working_dir or not local_dir:
+            self.status_text.append("⚠️ Error: Remote and Local Directories are required to harvest!")
+            return
+        self.status_text.append(f"Harvesting results from {working_dir}...")
+        emit = self.status_bridge.message.emit
+
+        def worker():
+            fetched = harvest_results(local_dir, working_dir, self.config)
+            emit(f"Harvested {len(fetched)} files into {local_dir}")
+            summary = summarize_metrics(local_dir)
+            if summary is not None:
+                by_stage, by_batch = summary
+                emit("Wall time by stage (s): " + ", ".join(
+                    f"{stage} {row.wall_total_s:.0f}" for stage, row in by_stage.iterrows()))
+                emit(f"Metrics summary written to {local_dir}/metrics_by_stage.csv")
+            disk = summarize_disk(local_dir)
+            if disk is not None:
+                emit(f"Disk high-water mark: {disk['peak_bytes'].max() / 1e9:.2f} GB per phase "
+                     f"(phase {disk['peak_bytes'].idxmax()}), "
+                     f"{disk['final_bytes'].sum() / 1e9:.2f} GB left across {len(disk)} phases")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def run_deferred_seds(self):
+        """Submits analyze_phases.py --sed-only with the analysis job's SLURM header."""
+        working_dir = self.fields["Remote Directory"].text().strip()
+        if not working_dir:
+            self.status_text.append("⚠️ Error: No remote directory selected!")
+            return
+        self.status_text.append(f"Submitting deferred SED job in {working_dir}...")
+        emit = self.status_bridge.message.emit
+
+        def worker():
+            job_ids = submit_sed_followup(working_dir, self.config)
+            if job_ids:
+                emit(f"SED follow-up submitted: job {', '.join(job_ids)}")
+            else:
+                emit("⚠️ SED follow-up was not submitted; has the analysis job run yet?")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    @traced("preflight", "io")
+    def preflight(self, mode):
+        """Runs preflight_checks on the GUI settings; False when generation must stop."""
+        start = time.perf_counter()
+        joint = mode == "Joint Epoch Fitting"
+
+        def values(label):
+            return [float(v) for v in self.fields[label].text().split(",")] if joint \
+                else [float(self.fields[label].text())]
+
+        phase_field = self.fields.get("Number of Phase Bins")
+        if mode == "Basic" and self.fields["Phase Sub-bins"].text().strip():
+            # gtmktime filters on the sub-bins, so their width sets the livetime loss
+            phase_field = self.fields["Phase Sub-bins"]
+        errors, warnings = preflight_checks(
+            self.fields["Event File"].text().strip(),
+            self.fields["Spacecraft File"].text().strip(),
+            float(self.fields["RA (J2000 Deg)"].text()),
+            float(self.fields["DEC (J2000 Deg)"].text()),
+            float(self.fields["Radius (Deg)"].text()),
+            float(self.fields["Min Energy (MeV)"].text()),
+            float(self.fields["Max Energy (MeV)"].text()),
+            list(zip(values("Min Time (MET)"), values("Max Time (MET)"))),
+            list(zip(values("T0 (MJD)"), values("Period (Days)"))),
+            phase_bins=int(phase_field.text()) if phase_field and phase_field.text().strip() else None,
+            joint=joint,
+        )
+        for warning in warnings:
+            self.status_text.append(f"Preflight warning: {warning}")
+        for error in errors:
+            self.status_text.append(f"⚠️ Preflight error: {error}")
+        elapsed = (time.perf_counter() - start) * 1000
+        self.status_text.append(f"Preflight {'failed' if errors else 'passed'} in {elapsed:.0f} ms")
+        return not errors
+
+    def quicklook_settings(self):
+        """Single-ephemeris settings used by the local quick-look tools."""
+        return {
+            "event_file": self.fields["Event File"].text().strip(),
+            "local_dir": self.fields["Local Directory"].text().strip(),
+            "ra": float(self.fields["RA (J2000 Deg)"].text()),
+            "dec": float(self.fields["DEC (J2000 Deg)"].text()),
+            "rad": float(self.fields["Radius (Deg)"].text()),
+            "t0": float(self.fields["T0 (MJD)"].text().split(',')[0]),
+            "period": float(self.fields["Period (Days)"].text().split(',')[0]),
+            "tmin": float(self.fields["Min Time (MET)"].text().split(',')[0]),
+            "tmax": float(self.fields["Max Time (MET)"].text().split(',')[-1]),
+            "emin": float(self.fields["Min Energy (MeV)"].text()),
+            "emax": float(self.fields["Max Energy (MeV)"].text()),
+            "ebins": int(self.fields["Number of Energy Bins"].text()),
+            # Worker threads must not touch the widgets
+            "event_cache": self.event_cache_mode(),
+        }
+
+    def quicklook_ccubes(self):
+        """Builds every phase's counts cube locally in one pass over the Event File."""
+        try:
+            q = self.quicklook_settings()
+            phase_bins = int(self.fields["Number of Phase Bins"].text())
+            geometry = self.cube_settings(q["rad"], q["emin"], q["emax"], q["ebins"])
+        except (KeyError, ValueError) as e:
+            self.status_text.append(f"Quick-look error: {e}")
+            return
+        if not os.path.exists(q["event_file"]):
+            self.status_text.append("⚠️ Error: Event File must be readable locally for quick-look cubes!")
+            return
+        out_dir = os.path.join(q["local_dir"], "quicklook")
+        self.status_text.append(f"Building {phase_bins} phase counts cubes → {out_dir}")
+        emit = self.status_bridge.message.emit
+
+        def worker():
+            try:
+                start = time.time()
+                prepare_event_cache(q["event_file"], q["event_cache"])
+                written = build_phase_ccubes(q["event_file"], out_dir, q["ra"], q["dec"], q["rad"],
+                                             q["t0"], q["period"], phase_bins,
+                                             q["tmin"], q["tmax"], geometry)
+                emit(f"Wrote {len(written)} counts cubes in {time.time() - start:.1f} s")
+            except Exception as e:
+                emit(f"Quick-look error: {e}")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def quicklook_phaseogram(self):
+        """Folds the ROI photons locally and reports Z²ₘ/H-test before any cluster run."""
+        try:
+            q = self.quicklook_settings()
+        except ValueError as e:
+            self.status_text.append(f"Phaseogram error: {e}")
+            return
+        if not os.path.exists(q["event_file"]):
+            self.status_text.append("⚠️ Error: Event File must be readable locally for the phaseogram!")
+            return
+        os.makedirs(q["local_dir"] or ".", exist_ok=True)
+        source = self.fields["Source"].text()
+        path = os.path.join(q["local_dir"], f"{source}_quicklook_phaseogram.png")
+        emit, show = self.status_bridge.message.emit, self.status_bridge.image.emit
+
+        def worker():
+            try:
+                start = time.time()
+                prepare_event_cache(q["event_file"], q["event_cache"])
+                result = phaseogram(q["event_file"], q["ra"], q["dec"], q["rad"], q["t0"],
+                                    q["period"], q["tmin"], q["tmax"], q["emin"], q["emax"])
+                emit(f"Phaseogram: {result['n']} photons, Z²₂ = {result['z2_2']:.1f} "
+                     f"(p = {result['z2_2_prob']:.2g}), H = {result['h']:.1f} at m = {result['h_m']} "
+                     f"(p = {result['h_prob']:.2g}) in {time.time() - start:.1f} s")
+                show(plot_phaseogram(result, path, source))
+                emit(f"Phaseogram saved → {path}")
+            except Exception as e:
+                emit(f"Phaseogram error: {e}")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def search_period(self):
+        """Refines the period around the Period (Days) field with a Z²ₘ/H-test scan."""
+        try:
+            q = self.quicklook_settings()
+        except ValueError as e:
+            self.status_text.append(f"Period search error: {e}")
+            return
+        if not os.path.exists(q["event_file"]):
+            self.status_text.append("⚠️ Error: Event File must be readable locally for the period search!")
+            return
+        options = self.config.get("period_search", {})
+        n_pdot = options.get("n_pdot", 1)
+        pdot_max = options.get("pdot_max", 0.0)
+        pdots = np.linspace(-pdot_max, pdot_max, n_pdot) if n_pdot > 1 else [0.0]
+        source = self.fields["Source"].text()
+        os.makedirs(q["local_dir"] or ".", exist_ok=True)
+        base = os.path.join(q["local_dir"], f"{source}_periodogram")
+        self.status_text.append(f"Searching periods around {q['period']} d...")
+        emit, show = self.status_bridge.message.emit, self.status_bridge.image.emit
+
+        def worker():
+            try:
+                start = time.time()
+                prepare_event_cache(q["event_file"], q["event_cache"])
+                times = roi_photon_times(q["event_file"], q["ra"], q["dec"], q["rad"],
+                                         q["tmin"], q["tmax"], q["emin"], q["emax"])
+                result = period_search(times, q["t0"], q["period"],
+                                       nharm=options.get("nharm", 2),
+                                       span=options.get("span", 1e-3),
+                                       oversample=options.get("oversample", 5),
+                                       pdots=pdots,
+                                       processes=options.get("processes"))
+                pdot_grid, period_grid = np.meshgrid(result["pdots"], result["periods"], indexing="ij")
+                pd.DataFrame({
+                    "period": period_grid.ravel(),
+                    "pdot": pdot_grid.ravel(),
+                    "z2": result["z2"].ravel(),
+                    "h": result["h"].ravel(),
+                }).to_csv(base + ".csv", index=False)
+                emit(f"Best period {result['best_period']:.7f} d (Ṗ = {result['best_pdot']:.2e}), "
+                     f"Z²_{result['nharm']} = {result['best_z2']:.1f}, H = {result['best_h']:.1f} "
+                     f"from {result['z2'].size} trials × {result['n']} photons in {time.time() - start:.1f} s")
+                show(plot_periodogram(result, base + ".png", source))
+                emit(f"Periodogram saved → {base}.csv")
+            except Exception as e:
+                emit(f"Period search error: {e}")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def weighted_lightcurve(self):
+        """Phase-binned light curves from a weighted event file, without likelihood fits."""
+        try:
+            q = self.quicklook_settings()
+            phase_bins = int(self.fields["Number of Phase Bins"].text())
+            bands = parse_energy_bands(self.fields["Energy Bands (MeV)"].text())
+        except (KeyError, ValueError) as e:
+            self.status_text.append(f"Weighted light curve error: {e}")
+            return
+        weight_column = self.fields["Weight Column"].text().strip()
+        if not weight_column or not os.path.exists(q["event_file"]):
+            self.status_text.append("⚠️ Error: Weighted light curves need a local Event File and its Weight Column!")
+            return
+        sc_file = self.fields["Spacecraft File"].text().strip()
+        if not os.path.exists(sc_file):
+            self.status_text.append("⚠️ Spacecraft File not local: fluxes are weighted counts, not rates.")
+            sc_file = None
+        os.makedirs(q["local_dir"] or ".", exist_ok=True)
+        emit = self.status_bridge.message.emit
+
+        def worker():
+            try:
+                start = time.time()
+                prepare_event_cache(q["event_file"], q["event_cache"], [weight_column])
+                curves = weighted_light_curve(q["event_file"], weight_column, q["t0"], q["period"],
+                                              phase_bins, q["ra"], q["dec"], q["rad"],
+                                              q["tmin"], q["tmax"], q["emin"], q["emax"],
+                                              bands, sc_file)
+                for b, ((lo, hi), df) in enumerate(curves):
+                    # Kept apart from the fitted fluxes.csv that Harvest downloads
+                    name = "fluxes_weighted.csv" if b == 0 else f"fluxes_weighted_{lo:g}_{hi:g}MeV.csv"
+                    df.to_csv(os.path.join(q["local_dir"], name), index=False)
+                emit(f"Weighted light curves for {len(curves)} band(s) written to "
+                     f"{q['local_dir']} in {time.time() - start:.1f} s")
+            except Exception as e:
+                emit(f"Weighted light curve error: {e}")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def show_image(self, path):
+        """Opens a saved plot in its own window."""
+        window = QLabel()
+        window.setWindowTitle(os.path.basename(path))
+        window.setPixmap(QPixmap(path))
+        window.show()
+        self.image_windows.append(window)
+
+    def start_monitor(self, working_dir, job_ids, phase_bins, expected_flags):
+        """Follows submitted jobs in the background, streaming into status_text."""
+        self.status_text.append(f"Monitoring jobs: {', '.join(job_ids)}")
+        thread = monitor_in_background(
+            self.config, working_dir, job_ids, phase_bins, expected_flags,
+            self.status_bridge.message.emit
+        )
+        self.monitor_threads.append(thread)
 
     def gen_script(self, phase, phase_bins, ra, dec, t0, period, event_file, sc_file):
         cos_value = np.cos(360 / (2 * phase_bins) / 180 * np.pi)  # Precompute cosine
@@ -814,8 +3232,58 @@ class FermiScriptGenerator(QWidget):
         cos_value = np.cos(360 / (2 * phase_bins) / 180 * np.pi)  # Precompute cosine
         return f"""gtmktime apply_filter=yes evfile={event_file} scfile={sc_file} outfile=./{phase}.fits filter="(START > {tmins[0]}) && (START < {tmaxs[0]}) && (STOP > {tmins[0]}) && (STOP < {tmaxs[0]}) && COS(2*3.14159265359*( (START) /(86400)+ 51910-{t0s[0]} - {phase-1}*{periods[0]}*{1/phase_bins})/{periods[0]})>{cos_value} && COS(2*3.14159265359*(( STOP  )/(86400)+ 51910-{t0s[0]} - {phase-1}*{periods[0]}*{1/phase_bins})/{periods[0]})>{cos_value} || (START > {tmins[1]}) && (START < {tmaxs[1]}) && (STOP > {tmins[1]}) && (STOP < {tmaxs[1]}) && COS(2*3.14159265359*( (START) /(86400)+ 51910-{t0s[1]} - {phase-1}*{periods[1]}*{1/phase_bins})/{periods[1]})>{cos_value} && COS(2*3.14159265359*((STOP)/(86400)+ 51910-{t0s[1]} - {phase-1}*{periods[1]}*{1/phase_bins})/{periods[1]})>{cos_value} && (DATA_QUAL>0) && (LAT_CONFIG==1)" roicut=no"""
 
-    def gtselect_script(self, phase, ra, dec, radius, tmin, tmax, emin, emax):
-        return f"""gtselect infile=./${{PHASE}}.fits outfile=./ft1_00.fits ra={ra} dec={dec} rad={radius} tmin={tmin} tmax={tmax} emin={emin} emax={emax} zmin=0.0 zmax=90.0 evclass=128 evtype=3 convtype=-1 evtable="EVENTS" chatter=3 clobber=yes debug=no gui=no mode="ql" """
+    def band_grid(self, rad, emin, emax, ebins):
+        """Energy bands fitted per phase next to the full range; [] when off."""
+        if not self.band_grid_toggle.isChecked():
+            return []
+        bands = parse_energy_bands(self.fields["Energy Bands (MeV)"].text())
+        if not bands:
+            raise ValueError("The energy-band grid needs Energy Bands (MeV), e.g. 100-1000, 1000-10000")
+        grid = []
+        for lo, hi in bands:
+            if not emin <= lo < hi <= emax:
+                raise ValueError(f"Energy band {lo:g}-{hi:g} MeV is not inside Min/Max Energy")
+            # Same number of energy bins per decade as the full range
+            nbins = max(1, round(ebins * np.log(hi / lo) / np.log(emax / emin)))
+            grid.append({"emin": lo, "emax": hi, "enumbins": nbins,
+                         "geometry": self.cube_settings(rad, lo, hi, nbins)})
+        return grid
+
+    def phase_subbins(self, phase_bins):
+        """Base phase sub-bins of the GTI cache, or None when it is off."""
+        text = self.fields["Phase Sub-bins"].text().strip()
+        if not text:
+            return None
+        subbins = int(text)
+        # Bin edges sit at (2*SHIFT ± 1)/(2*phase_bins), which must be sub-bin edges
+        if subbins <= 0 or subbins % (2 * phase_bins):
+            raise ValueError(f"Phase Sub-bins must be a multiple of {2 * phase_bins} "
+                             f"(twice the Number of Phase Bins)")
+        return subbins
+
+    def gen_subbin_script(self, subbins, t0, period, event_file, sc_file):
+        # Sub-bin M covers phases [M, M+1)/subbins
+        cos_value = np.cos(np.pi / subbins)
+        return f"""gtmktime apply_filter=yes evfile={event_file} scfile={sc_file} outfile=sub_${{M}}.fits filter="COS(2*3.14159265359*(START/(86400)+ 51910-{t0} - (${{M}}+0.5)*{period}*{1/subbins})/{period})>{cos_value} && COS(2*3.14159265359*(STOP/(86400)+ 51910-{t0} - (${{M}}+0.5)*{period}*{1/subbins})/{period})>{cos_value} && (DATA_QUAL>0) && (LAT_CONFIG==1)" roicut=no"""
+
+    def gen_phase_subbins(self, phase_bins, subbins, t0, period, event_file, sc_file):
+        """Assembles a phase bin from cached sub-bin event lists listed in subbins.txt.
+
+        A sub-bin is keyed on its own gtmktime command, so every binning of the
+        same ephemeris and sub-bin count shares it through the product store.
+        """
+        per_bin = subbins // phase_bins
+        command = self.tool("gtmktime", self.gen_subbin_script(subbins, t0, period, event_file, sc_file))
+        return f"""# Sub-bins of this phase bin, wrapping around phase 0
+: > subbins.txt
+for M in $(seq $((SHIFT*{per_bin} - {per_bin // 2})) $((SHIFT*{per_bin} + {per_bin // 2} - 1))); do
+M=$(( (M + {subbins}) % {subbins} ))
+{self.reuse(command, command, ["sub_${M}.fits"], shift="${M}", force=True)}
+echo sub_${{M}}.fits >> subbins.txt
+done"""
+
+    def gtselect_script(self, phase, ra, dec, radius, tmin, tmax, emin, emax, infile="./${PHASE}.fits"):
+        return f"""gtselect infile={infile} outfile=./ft1_00.fits ra={ra} dec={dec} rad={radius} tmin={tmin} tmax={tmax} emin={emin} emax={emax} zmin=0.0 zmax=90.0 evclass=128 evtype=3 convtype=-1 evtable="EVENTS" chatter=3 clobber=yes debug=no gui=no mode="ql" """
 
     def gtselect_script_adaptive(self, phase, event_file_dir, ra, dec, radius, tmin, tmax, emin, emax,pmin,pmax):
         # retun f"""gtselect infile="+str(event_file)+" outfile=./ft1_00.fits ra="+str(ra)+" dec="+str(dec)+" rad=15 tmin="+str(tmin)+" tmax="+str(tmax)+" phasemin="+str(phases[int(phase),0])+" phasemax="+str(phases[int(phase),1]) + " emin="+str(emin)+" emax="+str(emax)+" zmin=0.0 zmax=90.0 evclass=128 evtype=3 convtype=-1 evtable=\"EVENTS\" chatter=3 clobber=yes debug=no gui=no mode=\"ql\" """
@@ -824,11 +3292,11 @@ class FermiScriptGenerator(QWidget):
     def gtselect_script_multiple(self, phase, ra, dec, radius, tmins, tmaxs, emin, emax):
         return f"""gtselect infile=./{phase}.fits outfile=./ft1_00.fits ra={ra} dec={dec} rad={radius} tmin={tmins[0]} tmax={tmaxs[1]} emin={emin} emax={emax} zmin=0.0 zmax=90.0 evclass=128 evtype=3 convtype=-1 evtable="EVENTS" chatter=3 clobber=yes debug=no gui=no mode="ql" """
 
-    def gtbin_script(self, phase, sc_file, emin, emax, ebins, ra, dec):
-        return f"""gtbin evfile=./ft1_00.fits scfile={sc_file} outfile=./ccube_00.fits algorithm="ccube" ebinalg="LOG" emin={emin} emax={emax} enumbins={ebins} ebinfile=NONE tbinalg="LIN" tbinfile=NONE nxpix=200 nypix=200 binsz=0.1 coordsys="CEL" xref={ra} yref={dec} axisrot=0.0 rafield="RA" decfield="DEC" proj="AIT" hpx_ordering_scheme="RING" hpx_order=3 hpx_ebin=yes hpx_region= evtable="EVENTS" sctable="SC_DATA" efield="ENERGY" tfield="TIME" chatter=3 clobber=yes debug=no gui=no mode="ql" """
+    def gtbin_script(self, phase, sc_file, emin, emax, ebins, ra, dec, npix=200, binsz=0.1, suffix="00"):
+        return f"""gtbin evfile=./ft1_00.fits scfile={sc_file} outfile=./ccube_{suffix}.fits algorithm="ccube" ebinalg="LOG" emin={emin} emax={emax} enumbins={ebins} ebinfile=NONE tbinalg="LIN" tbinfile=NONE nxpix={npix} nypix={npix} binsz={binsz} coordsys="CEL" xref={ra} yref={dec} axisrot=0.0 rafield="RA" decfield="DEC" proj="AIT" hpx_ordering_scheme="RING" hpx_order=3 hpx_ebin=yes hpx_region= evtable="EVENTS" sctable="SC_DATA" efield="ENERGY" tfield="TIME" chatter=3 clobber=yes debug=no gui=no mode="ql" """
 
-    def gtbin_script_multiple(self, phase, sc_file, emin, emax, ebins, ra, dec):
-        return f"""gtbin evfile=./ft1_00.fits scfile={sc_file} outfile=./ccube_00.fits algorithm="ccube" ebinalg="LOG" emin={emin} emax={emax} enumbins={ebins} ebinfile=NONE tbinalg="LIN" tbinfile=NONE nxpix=200 nypix=200 binsz=0.1 coordsys="CEL" xref={ra} yref={dec} axisrot=0.0 rafield="RA" decfield="DEC" proj="AIT" hpx_ordering_scheme="RING" hpx_order=3 hpx_ebin=yes hpx_region= evtable="EVENTS" sctable="SC_DATA" efield="ENERGY" tfield="TIME" chatter=3 clobber=yes debug=no gui=no mode="ql" """
+    def gtbin_script_multiple(self, phase, sc_file, emin, emax, ebins, ra, dec, npix=200, binsz=0.1, suffix="00"):
+        return f"""gtbin evfile=./ft1_00.fits scfile={sc_file} outfile=./ccube_{suffix}.fits algorithm="ccube" ebinalg="LOG" emin={emin} emax={emax} enumbins={ebins} ebinfile=NONE tbinalg="LIN" tbinfile=NONE nxpix={npix} nypix={npix} binsz={binsz} coordsys="CEL" xref={ra} yref={dec} axisrot=0.0 rafield="RA" decfield="DEC" proj="AIT" hpx_ordering_scheme="RING" hpx_order=3 hpx_ebin=yes hpx_region= evtable="EVENTS" sctable="SC_DATA" efield="ENERGY" tfield="TIME" chatter=3 clobber=yes debug=no gui=no mode="ql" """
 
     def gtltcube_script(self, phase, sc_file, tmin, tmax):
         return f"""gtltcube evfile=./ft1_00.fits evtable="EVENTS" scfile={sc_file} sctable="SC_DATA" outfile=./ltcube_00.fits dcostheta=0.025 binsz=1.0 phibins=0 tmin={tmin} tmax={tmax} file_version="1" zmin=0.0 zmax=90.0 chatter=2 clobber=yes debug=no gui=no mode="ql" """
@@ -836,7 +3304,170 @@ class FermiScriptGenerator(QWidget):
     def gtltcube_script_multiple(self, phase, sc_file, tmins, tmaxs):
         return f"""gtltcube evfile=./ft1_00.fits evtable="EVENTS" scfile={sc_file} sctable="SC_DATA" outfile=./ltcube_00.fits dcostheta=0.025 binsz=1.0 phibins=0 tmin={tmins[0]} tmax={tmaxs[1]} file_version="1" zmin=0.0 zmax=90.0 chatter=2 clobber=yes debug=no gui=no mode="ql" """
 
-    def gen_header(self,phase, working_dir, phase_bins,cores,RUNTIME, FERMI_MAKE_DIR,PARTITION,CLUSTER_SCRIPT_PATH,FermiPyFermiTools_Installation):
+    def tool(self, stage, command):
+        """Runs a tool through fp_run, plus fp_measure when metrics are enabled."""
+        if self.metrics_toggle.isChecked():
+            command = f"fp_measure {stage} {command}"
+        return f"fp_run {stage} {command}"
+
+    def gen_shell_functions(self, working_dir, input_files, store=False):
+        """Helper functions defined ahead of run_phase in every batch script."""
+        functions = []
+        if self.metrics_toggle.isChecked():
+            functions.append(self.gen_metrics_function())
+        if self.reuse_toggle.isChecked() or store:
+            functions.append(self.gen_reuse_functions(working_dir, input_files))
+        functions.append(self.gen_lifecycle_functions())
+        functions.append(self.gen_status_functions(working_dir))
+        return "\n".join(functions)
+
+    def lifecycle_mode(self):
+        """What happens to an intermediate file once its consumer has finished."""
+        mode = self.fields["Intermediate Files"].text().strip().lower() or "keep"
+        if mode not in ("delete", "compress", "keep"):
+            raise ValueError("Intermediate Files must be delete, compress or keep")
+        return mode
+
+    def fit_settings(self):
+        """Fit strategy for analyze_phases.py; tier settings come from setup.yaml."""
+        strategy = self.fields["Fit Strategy"].text().strip().lower() or "full"
+        if strategy not in ("full", "tiered"):
+            raise ValueError("Fit Strategy must be full or tiered")
+        options = self.config.get("fit", {})
+        return {
+            "strategy": strategy,
+            "fast": {"min_fit_quality": 3, "optimizer": options.get("fast_optimizer", "MINUIT"),
+                     "retries": options.get("fast_retries", 3), "tol": options.get("fast_tol", 1e-4)},
+            "full": {"min_fit_quality": 3, "optimizer": "NEWMINUIT", "retries": 1000, "tol": 1e-8},
+            "norm_only_ts": options.get("norm_only_ts", 25.0),
+        }
+
+    def joint_fit_settings(self):
+        """Shared-background joint fit; tolerances come from setup.yaml."""
+        options = self.config.get("joint_fit", {})
+        return {
+            "enabled": self.joint_fit_toggle.isChecked(),
+            "background_radius": float(options.get("background_radius", 15.0)),
+            "max_iter": int(options.get("max_iter", 5)),
+            "tol": float(options.get("tol", 0.1)),
+        }
+
+    def sed_settings(self):
+        """TS gate, deferral and energy-bin parallelism for the phase SEDs."""
+        min_ts = self.fields["SED Min TS"].text().strip()
+        return {
+            # A blank threshold keeps the SED of every phase
+            "min_ts": float(min_ts) if min_ts else None,
+            "defer": self.defer_sed_toggle.isChecked(),
+            "workers": int(self.config.get("sed", {}).get("workers", 1)),
+        }
+
+    def gen_lifecycle_functions(self):
+        retire = {
+            "delete": 'rm -f "$@"',
+            "compress": 'for f in "$@"; do [ -f "$f" ] && gzip -f "$f"; done',
+            "keep": ":",
+        }[self.lifecycle_mode()]
+        return f"""
+# Disk high-water mark of the phase directory, sampled after each stage
+fp_disk (){{
+FP_DISK_NOW=$(du -sb . 2>/dev/null | cut -f1)
+if [ "${{FP_DISK_NOW:-0}}" -gt "${{FP_DISK_PEAK:-0}}" ]; then
+    FP_DISK_PEAK=${{FP_DISK_NOW}}
+fi
+}}
+
+fp_disk_report (){{
+fp_disk
+printf '{{"phase": %s, "batch": %s, "peak_bytes": %s, "final_bytes": %s}}\\n' \\
+    "${{PHASE:-0}}" "${{BATCH:-0}}" "${{FP_DISK_PEAK:-0}}" "${{FP_DISK_NOW:-0}}" > disk.json
+}}
+
+# Called on intermediates whose consumer has finished
+fp_retire (){{
+{retire}
+}}
+"""
+
+    def gen_status_functions(self, working_dir):
+        # A failed stage ends its phase (run_phase runs in a subshell) and
+        # leaves failed_<phase>.flag with the stage and exit code behind
+        return f"""
+fp_run (){{
+FP_RUN_STAGE=$1
+shift
+"$@"
+FP_RUN_RC=$?
+if [ "$FP_RUN_RC" -ne 0 ]; then
+    echo "${{FP_RUN_STAGE}} ${{FP_RUN_RC}}" > {working_dir}/failed_${{PHASE}}.flag
+    echo "Phase ${{PHASE}} failed in ${{FP_RUN_STAGE}} (exit ${{FP_RUN_RC}})"
+    exit "$FP_RUN_RC"
+fi
+}}
+"""
+
+    def gen_reuse_functions(self, working_dir, input_files):
+        # Products live in FP_STORE/<key>/ and are hard-linked into phase dirs
+        return f"""
+FP_STORE={working_dir}/.fp_store
+FP_INPUT_ID=$(stat -L -c '%n:%s:%Y' {" ".join(input_files)} 2>/dev/null | tr '\\n' ' ')
+
+# Key of one product: command-template digest, phase shift, input file identity
+fp_key (){{
+printf '%s|%s|%s' "$1" "$2" "${{FP_INPUT_ID}}" | sha256sum | cut -c1-16
+}}
+
+fp_restore (){{
+FP_DIR=${{FP_STORE}}/$1
+shift
+for f in "$@"; do
+    [ -f "${{FP_DIR}}/$f" ] || return 1
+done
+for f in "$@"; do
+    ln -f "${{FP_DIR}}/$f" "$f" 2>/dev/null || cp "${{FP_DIR}}/$f" "$f"
+done
+echo "Reused $* from ${{FP_DIR}}"
+}}
+
+fp_store (){{
+FP_DIR=${{FP_STORE}}/$1
+shift
+mkdir -p "${{FP_DIR}}.tmp${{PHASE}}"
+for f in "$@"; do
+    [ -f "$f" ] || {{ rm -rf "${{FP_DIR}}.tmp${{PHASE}}"; return 1; }}
+    ln -f "$f" "${{FP_DIR}}.tmp${{PHASE}}/$f" 2>/dev/null || cp "$f" "${{FP_DIR}}.tmp${{PHASE}}/$f"
+done
+rm -rf "${{FP_DIR}}"
+mv "${{FP_DIR}}.tmp${{PHASE}}" "${{FP_DIR}}"
+}}
+"""
+
+    def gen_metrics_function(self):
+        # GNU time reports wall, user, system, peak RSS (KB) and block I/O (512 B)
+        return """
+# Appends one JSON line per tool run to the phase's metrics.jsonl
+fp_measure (){
+FP_STAGE=$1
+shift
+if [ -x /usr/bin/time ]; then
+    /usr/bin/time -o .fp_time -f "%e %U %S %M %I %O" "$@"
+    FP_RC=$?
+    tail -n 1 .fp_time | awk -v phase="${PHASE:-0}" -v batch="${BATCH:-0}" -v stage="${FP_STAGE}" -v rc="${FP_RC}" \\
+        '{printf "{\\"phase\\": %s, \\"batch\\": %s, \\"stage\\": \\"%s\\", \\"exit\\": %s, \\"wall_s\\": %s, \\"cpu_s\\": %.2f, \\"max_rss_kb\\": %s, \\"read_bytes\\": %d, \\"write_bytes\\": %d}\\n", phase, batch, stage, rc, $1, $2 + $3, $4, $5 * 512, $6 * 512}' >> metrics.jsonl
+    rm -f .fp_time
+else
+    FP_T0=$(date +%s.%N)
+    "$@"
+    FP_RC=$?
+    FP_T1=$(date +%s.%N)
+    awk -v phase="${PHASE:-0}" -v batch="${BATCH:-0}" -v stage="${FP_STAGE}" -v rc="${FP_RC}" -v t0="${FP_T0}" -v t1="${FP_T1}" \\
+        'BEGIN {printf "{\\"phase\\": %s, \\"batch\\": %s, \\"stage\\": \\"%s\\", \\"exit\\": %s, \\"wall_s\\": %.2f, \\"cpu_s\\": null, \\"max_rss_kb\\": null, \\"read_bytes\\": null, \\"write_bytes\\": null}\\n", phase, batch, stage, rc, t1 - t0}' >> metrics.jsonl
+fi
+return $FP_RC
+}
+"""
+
+    def gen_header(self,phase, working_dir, phase_bins,cores,RUNTIME, FERMI_MAKE_DIR,PARTITION,CLUSTER_SCRIPT_PATH,FermiPyFermiTools_Installation,functions=""):
         return f"""#!/bin/sh
 
 #SBATCH -p {PARTITION}
@@ -850,12 +3481,14 @@ class FermiScriptGenerator(QWidget):
 
 
 conda activate {FermiPyFermiTools_Installation}
-
+{functions}
 run_phase (){{
 
 PHASE=$1
 SHIFT=$2
+FP_DISK_PEAK=0
 
+rm -f done_${{PHASE}}.flag failed_${{PHASE}}.flag
 rm -rf ${{PHASE}}
 mkdir -p ${{PHASE}}
 cd ${{PHASE}}
@@ -864,34 +3497,44 @@ cd ${{PHASE}}
 """
 
 
-    def gen_closer(self, phase_bins, working_dir, phase, cores, RUNTIME, PARTITION,FERMI_MAKE_DIR,email,CLUSTER_SCRIPT_PATH,FermiPyFermiTools_Installation):
+    @traced("render_closer", "render")
+    def gen_closer(self, phase_bins, working_dir, phase, cores, RUNTIME, PARTITION,FERMI_MAKE_DIR,email,CLUSTER_SCRIPT_PATH,FermiPyFermiTools_Installation, phase_queue=None, placeholders=False, analysis_phases=None):
+        if phase_queue is None:
+            phase_queue = range(phase*cores + 1, min((phase + 1)*cores, phase_bins) + 1)
+        first_phase, batch, queue = phase*cores, phase, " ".join(str(p) for p in phase_queue)
+        # A resubmission refits only its own phases; the others keep their stored fits
+        analysis_args = ""
+        if analysis_phases:
+            analysis_args = " --phases " + ",".join(str(p) for p in sorted(analysis_phases))
+        if placeholders:
+            # Filled in per batch by the cluster-side manifest expander
+            first_phase, batch, queue = MANIFEST_PLACEHOLDERS
         return f"""
+fp_disk_report
 cd ..
+touch done_${{PHASE}}.flag
 echo phase done
 }}
 
 
 CORES={cores}
 PHASE_BINS={phase_bins}
-PHASE={phase*cores}
-
-
-BLOCK=phase//cores
+PHASE={first_phase}
+BATCH={batch}
 
+# Work queue: a phase starts as soon as one of the CORES slots frees up
+PHASE_QUEUE="{queue}"
 
-END=$((PHASE + CORES -1))
-N_BLOCKS=$(( (PHASE_BINS + CORES - 1) / CORES ))
-
-
-
-for ((i=PHASE; i<=END && i<=PHASE_BINS-1; i++)); do
-    run_phase $((i+1)) $((i)) &
+for p in ${{PHASE_QUEUE}}; do
+    while [ "$(jobs -rp | wc -l)" -ge "$CORES" ]; do
+        wait -n
+    done
+    run_phase $((p)) $((p-1)) &
 done
 
 wait
 
 
-touch done_${{PHASE}}.flag
 sleep 60
 
 
@@ -901,7 +3544,7 @@ if [ "$COUNT" -eq "$PHASE_BINS" ]; then
     echo "All $COUNT phases complete. Running analysis."
     for i in {{1..{phase_bins}}}
     do
-    cp config.yaml $i
+    cp config*.yaml $i
     done
 
 
@@ -932,11 +3575,13 @@ if [ "$COUNT" -eq "$PHASE_BINS" ]; then
 
 conda activate {FermiPyFermiTools_Installation}
 
-python analyze_phases.py #Needs better parallelization - will be updated soon.
+python analyze_phases.py{analysis_args} #Needs better parallelization - will be updated soon.
 EOF
 
 
-    sbatch analyze_script.sh
+    # The job ID lets a monitor follow the analysis to its end
+    sbatch --parsable analyze_script.sh | cut -d';' -f1 > analysis_job.id
+    echo "Submitted analysis job $(cat analysis_job.id)"
 else
     echo "⏳ $COUNT/{phase_bins} phases done. Passing to another node..."
 fi
@@ -946,10 +3591,14 @@ fi
     # Config File generation
     # Please update your config file accordingly
     # =============================================================================
+    @traced("write_config", "io")
     def generate_config(self, phase, local_dir, event_file, sc_file, ra, dec,
                         radius, tmin, tmax, emin, emax, ebins,
                         CLUSTER_ISODIFF_PATH, CLUSTER_GALDIFF_PATH,
-                        CLUSTER_CAT_PATH, CLUSTER_EXT_CAT_PATH ):
+                        CLUSTER_CAT_PATH, CLUSTER_EXT_CAT_PATH, geometry=None, band=None ):
+        if geometry is None:
+            geometry = cube_geometry(radius, emin, emax, ebins)
+        fine = geometry[-1]
 
         config = {
             "data": {
@@ -958,10 +3607,10 @@ fi
                 "ltcube": "./ltcube_00.fits",
             },
             "binning": {
-                "roiwidth": radius,
-                "binsz": radius/200,
-                "binsperdec": 8,
-                "enumbins": ebins,
+                "roiwidth": fine["roiwidth"],
+                "binsz": fine["binsz"],
+                "binsperdec": fine["binsperdec"],
+                "enumbins": fine["enumbins"] if len(geometry) == 1 else ebins,
             },
             "selection": {
                 "emin": emin,
@@ -987,26 +3636,277 @@ fi
                 "catalogs": CLUSTER_CAT_PATH
             }
         }
-        config_path = os.path.join(local_dir, f"config.yaml")
+        if len(geometry) > 1:
+            # Coarser pixels at low energy; fermipy picks up ccube_0k/ft1_0k
+            config["components"] = [
+                {
+                    "selection": {"emin": c["emin"], "emax": c["emax"]},
+                    "binning": {
+                        "roiwidth": c["roiwidth"],
+                        "binsz": c["binsz"],
+                        "binsperdec": c["binsperdec"],
+                        "enumbins": c["enumbins"],
+                    },
+                }
+                for c in geometry
+            ]
+        name = "config.yaml"
+        if band is not None:
+            # Band fits read the phase's FT1 and livetime cube but keep their
+            # cubes, source maps and ROI snapshots in band_<b>/
+            config["fileio"] = {"outdir": f"band_{band}"}
+            name = f"config_band_{band}.yaml"
+        config_path = os.path.join(local_dir, name)
         with open(config_path, "w") as f:
             yaml.dump(config, f, default_flow_style=False, sort_keys=False)
 
         self.status_text.append(f"Config saved: {config_path}")
         self.close()
-    def generate_analysis_script(self, i, local_dir,working_dir,phase_bins,SRCNAME,CLUSTER_EXT_CAT_PATH):
+    @traced("render_analysis", "render")
+    def generate_analysis_script(self, i, local_dir,working_dir,phase_bins,SRCNAME,CLUSTER_EXT_CAT_PATH,instrument=False,intermediates="delete",fit_strategy=None,sed_settings=None,joint_fit=None,energy_bands=None):
         """Write a phase-analysis driver Python script."""
+        fit_strategy = fit_strategy or {"strategy": "full"}
+        sed_settings = sed_settings or {"min_ts": None, "defer": False, "workers": 1}
+        joint_fit = joint_fit or {"enabled": False}
+        energy_bands = energy_bands or []
         script_content = f"""import os
 import re
+import gzip
+import argparse
+import multiprocessing
+import json
+import time
+import shutil
+import resource
+import fcntl
+from fnmatch import fnmatch
+from contextlib import contextmanager
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from math import *  # better to import only what you need
+from scipy.optimize import minimize
+import pyLikelihood as pyLike
 from fermipy.gtanalysis import GTAnalysis
 
 os.environ["LATEXTDIR"] = "{CLUSTER_EXT_CAT_PATH}"
 
 DEBUG = True
 VERBOSITY = 4 if DEBUG else 0
+INSTRUMENT = {instrument}
+INTERMEDIATES = '{intermediates}'
+FIT_STRATEGY = {fit_strategy!r}
+SED_SETTINGS = {sed_settings!r}
+JOINT_FIT = {joint_fit!r}
+# (emin, emax) of bands 1..n; band 0 is the full energy range in ./config.yaml
+ENERGY_BANDS = {energy_bands!r}
+
+# -------------------------
+# METRICS
+# Same JSON-lines schema as fp_measure in the batch scripts
+# -------------------------
+def _io_bytes():
+    try:
+        with open("/proc/self/io") as f:
+            io = dict(line.split(": ") for line in f.read().splitlines())
+        return int(io["read_bytes"]), int(io["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+@contextmanager
+def measure(stage, phase_bin):
+    if not INSTRUMENT:
+        yield
+        return
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    read0, write0 = _io_bytes()
+    rc = 0
+    try:
+        yield
+    except Exception:
+        rc = 1
+        raise
+    finally:
+        read1, write1 = _io_bytes()
+        record = {{
+            "phase": phase_bin, "batch": "analysis", "stage": stage, "exit": rc,
+            "wall_s": round(time.perf_counter() - wall0, 2),
+            "cpu_s": round(time.process_time() - cpu0, 2),
+            # ru_maxrss is the peak of the whole analysis process so far
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "read_bytes": read1 - read0,
+            "write_bytes": write1 - write0,
+        }}
+        with open("metrics.jsonl", "a") as f:
+            f.write(json.dumps(record) + "\\n")
+
+# -------------------------
+# RESULTS STORE
+# One typed, pickle-free .npz per run holding every phase fit and SED row
+# -------------------------
+RESULTS_STORE = '{working_dir}/{SRCNAME}_results.npz'
+MAX_PARS = 5
+PAR_ORDER = {{
+    "PowerLaw": ["Prefactor", "Index"],
+    "LogParabola": ["norm", "alpha", "beta", "Eb"],
+    "PLSuperExpCutoff4": ["Prefactor", "Index", "Expfactor", "ExpfactorS", "S"],
+}}
+SED_COLUMNS = ["energy(MeV)", "energy_min", "energy_max", "flux(MeV/cm2/s)", "flux_err", "ts", "UL"]
+
+def phase_record(gta, name, phase_bin, fit_tier="full", band=0):
+    # Flattens one phase fit of a source into fixed-width typed values
+    src = gta.roi[name]
+    pars = src['spectral_pars']
+    names = PAR_ORDER.get(src['SpectrumType'], list(pars)[:MAX_PARS])
+    values = np.zeros(MAX_PARS)
+    errors = np.zeros(MAX_PARS)
+    par_names = [""] * MAX_PARS
+    for j, par in enumerate(names):
+        values[j] = pars[par]['value']
+        errors[j] = pars[par]['error']
+        par_names[j] = par
+    return {{
+        "phase_bin": phase_bin,
+        "source": name,
+        "spectrum_type": src['SpectrumType'],
+        "flux": src['flux'],
+        "flux_err": src['flux_err'],
+        "ts": src['ts'],
+        "par_values": values,
+        "par_errors": errors,
+        "par_names": par_names,
+        "fit_tier": fit_tier,
+        "band": band,
+    }}
+
+def store_columns(records, sed):
+    # Phase records plus SED rows as typed columns
+    columns = {{
+        "phase_bin": np.array([r["phase_bin"] for r in records], dtype=np.int32),
+        "source": np.array([r["source"] for r in records], dtype="U64"),
+        "spectrum_type": np.array([r["spectrum_type"] for r in records], dtype="U32"),
+        "flux": np.array([r["flux"] for r in records], dtype=np.float64),
+        "flux_err": np.array([r["flux_err"] for r in records], dtype=np.float64),
+        "ts": np.array([r["ts"] for r in records], dtype=np.float64),
+        "par_values": np.array([r["par_values"] for r in records], dtype=np.float64).reshape(-1, MAX_PARS),
+        "par_errors": np.array([r["par_errors"] for r in records], dtype=np.float64).reshape(-1, MAX_PARS),
+        "par_names": np.array([r["par_names"] for r in records], dtype="U32").reshape(-1, MAX_PARS),
+        "fit_tier": np.array([r["fit_tier"] for r in records], dtype="U16"),
+        "band": np.array([r["band"] for r in records], dtype=np.int32),
+        "sed_phase_bin": sed["phase_bin"].to_numpy(dtype=np.int32),
+        "sed_band": sed["band"].to_numpy(dtype=np.int32),
+        "sed_source": sed["source"].to_numpy(dtype="U64"),
+    }}
+    for col in SED_COLUMNS:
+        dtype = bool if col == "UL" else np.float64
+        columns["sed_" + col] = sed[col].to_numpy(dtype=dtype)
+    return columns
+
+def save_store(path, columns):
+    # Readers never see a half-written store
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **columns)
+    os.replace(tmp, path)
+
+@contextmanager
+def store_lock(path):
+    # Serializes read-modify-write of the store across analysis processes
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def upsert_results_store(path, records, sed):
+    # Replaces the rows of the (phase, band) pairs in records/sed, keeps the rest
+    with store_lock(path):
+        new = store_columns(records, sed)
+        if not os.path.exists(path):
+            save_store(path, new)
+            return
+        store = read_results_store(path)
+        done = set(zip(new["phase_bin"], new["band"], new["source"]))
+        keep = np.array([key not in done for key in zip(store["phase_bin"], store["band"], store["source"])],
+                        dtype=bool)
+        done_sed = set(zip(new["sed_phase_bin"], new["sed_band"])) | {{(p, b) for p, b, _ in done}}
+        keep_sed = np.array([key not in done_sed for key in zip(store["sed_phase_bin"], store["sed_band"])],
+                            dtype=bool)
+        merged = {{}}
+        for key, column in new.items():
+            old = store[key][keep_sed if key.startswith("sed_") else keep]
+            merged[key] = np.concatenate([old.astype(column.dtype), column])
+        save_store(path, merged)
+
+def reset_results_store(path):
+    # A full run starts from an empty store, so no rows of an earlier binning linger
+    with store_lock(path):
+        if os.path.exists(path):
+            os.remove(path)
+
+def read_results_store(path):
+    with np.load(path, allow_pickle=False) as store:
+        store = {{key: store[key] for key in store.files}}
+    # Stores written before the band grid hold the full range only
+    store.setdefault("band", np.zeros(len(store["phase_bin"]), dtype=np.int32))
+    store.setdefault("sed_band", np.zeros(len(store["sed_phase_bin"]), dtype=np.int32))
+    return store
+
+def replace_store_seds(path, sed):
+    # Swaps in new SED rows for the (phase, band) pairs present in sed
+    with store_lock(path):
+        _replace_store_seds(path, sed)
+
+def _replace_store_seds(path, sed):
+    store = read_results_store(path)
+    replaced = set(zip(sed["phase_bin"], sed["band"]))
+    keep = np.array([pair not in replaced for pair in zip(store["sed_phase_bin"], store["sed_band"])],
+                    dtype=bool)
+    for key in [k for k in store if k.startswith("sed_")]:
+        new = sed[key[len("sed_"):]].to_numpy(dtype=store[key].dtype)
+        store[key] = np.concatenate([store[key][keep], new])
+    save_store(path, store)
+
+# -------------------------
+# INTERMEDIATE FILES
+# Once a phase is fitted only its declared outputs are kept
+# -------------------------
+DECLARED_OUTPUTS = ["config.yaml", "*.log", "*.png", "*_sed.csv", "norm*", "spectral_pars*",
+                    "metrics.jsonl", "disk.json", "fit_tier.txt", "*.gz"]
+
+def directory_bytes(directory):
+    return sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)
+               if os.path.isfile(os.path.join(directory, f)))
+
+def retire_intermediates(directory):
+    # Deletes or gzips undeclared files and records the fitted footprint in disk.json
+    fitted = directory_bytes(directory)
+    if INTERMEDIATES != "keep":
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not os.path.isfile(path) or any(fnmatch(name, p) for p in DECLARED_OUTPUTS):
+                continue
+            if os.path.islink(path):
+                # Band directories link the phase's FT1; never compress a copy
+                os.remove(path)
+                continue
+            if INTERMEDIATES == "compress":
+                with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+            os.remove(path)
+
+    report_path = os.path.join(directory, "disk.json")
+    report = {{}}
+    if os.path.exists(report_path):
+        with open(report_path) as f:
+            report = json.load(f)
+    # Footprint once the fit is done, before retiring; the fit itself is not sampled
+    report["fitted_bytes"] = fitted
+    report["peak_bytes"] = max(report.get("peak_bytes", 0), fitted)
+    report["final_bytes"] = directory_bytes(directory)
+    with open(report_path, "w") as f:
+        json.dump(report, f)
 
 def double_fig(*args):
     out = [np.array([args[0], args[0] + 1]).flatten()]
@@ -1014,42 +3914,253 @@ def double_fig(*args):
         out.append(np.array([arg, arg]).flatten())
     return out
 
-def setup_gta(directory,phase_bin):
-    phase_bin = phase_bin
-    os.chdir(directory)
-    match = re.search(r'{working_dir}(.*)', directory)
-    string = match[1] if match else None
+# -------------------------
+# FIT STRATEGIES
+# Both return the tier the phase needed
+# -------------------------
+def fit_full(gta, phase_bin):
+    with measure("curvature", phase_bin):
+        gta.curvature('{SRCNAME}') #e eventually may save curvature test results  #
 
-    gta = GTAnalysis(
-        './config.yaml',
-        optimizer={{'min_fit_quality': 3}},
-        logging={{'verbosity': 3}}
-    )
-    gta.setup(optimizer={{
-        'min_fit_quality': 3,
-        'optimizer': "MINUIT",
-        'retries': 1000,
-        'max_iter': 1000
-    }})
-    gta.curvature('{SRCNAME}') #e eventually may save curvature test results  #
+    with measure("optimize", phase_bin):
+        gta.optimize() # At some point this will be replaced w a integrated model #
+
+    gta.free_sources(distance=15, free=False)
+    gta.free_source('{SRCNAME}', pars='norm')
+
+    with measure("fit_norm", phase_bin):
+        gta.fit(min_fit_quality=3, optimizer='MINUIT', retries=1000, tol=1e-8)
+        gta.write_roi('norm', make_plots=True)
+
+    gta.free_source('{SRCNAME}', free=True)
 
-    gta.optimize() # At some point this will be replaced w a integrated model #
+    with measure("fit_full", phase_bin):
+        gta.fit(min_fit_quality=3, optimizer='NEWMINUIT', retries=1000, tol=1e-8)
+        gta.write_roi('spectral_pars', make_plots=True)
+    return "full"
+
+def fit_converged(fit):
+    return fit['fit_success'] and fit['fit_quality'] >= 3
+
+def fit_tiered(gta, phase_bin):
+    # Cheap settings first, the full ones only for fits that did not converge.
+    # The curvature test is skipped since its result is not used downstream.
+    fast, full = FIT_STRATEGY["fast"], FIT_STRATEGY["full"]
+    tier = "fast"
+
+    with measure("optimize", phase_bin):
+        gta.optimize()
 
     gta.free_sources(distance=15, free=False)
     gta.free_source('{SRCNAME}', pars='norm')
 
-    gta.fit(min_fit_quality=3, optimizer='MINUIT', retries=1000, tol=1e-8)
-    gta.write_roi('norm', make_plots=True)
+    with measure("fit_norm", phase_bin):
+        fit = gta.fit(**fast)
+        if not fit_converged(fit):
+            tier = "full"
+            fit = gta.fit(**full)
+        gta.write_roi('norm', make_plots=True)
+
+    if gta.roi['{SRCNAME}']['ts'] < FIT_STRATEGY["norm_only_ts"]:
+        # Too faint to constrain the shape; keep the catalog spectral parameters
+        gta.write_roi('spectral_pars', make_plots=True)
+        return tier + "_norm"
 
     gta.free_source('{SRCNAME}', free=True)
 
-    gta.fit(min_fit_quality=3, optimizer='NEWMINUIT', retries=1000, tol=1e-8)
-    gta.write_roi('spectral_pars', make_plots=True)
+    with measure("fit_full", phase_bin):
+        fit = gta.fit(**(fast if tier == "fast" else full))
+        if not fit_converged(fit) and tier == "fast":
+            tier = "full"
+            fit = gta.fit(**full)
+        gta.write_roi('spectral_pars', make_plots=True)
+    return tier
+
+def band_config(band):
+    return './config.yaml' if band == 0 else f'./config_band_{{band}}.yaml'
+
+def load_gta(directory, phase_bin, band=0):
+    os.chdir(directory)
+    with measure("fermipy_setup", phase_bin):
+        gta = GTAnalysis(
+            band_config(band),
+            optimizer={{'min_fit_quality': 3}},
+            logging={{'verbosity': 3}}
+        )
+        gta.setup(optimizer={{
+            'min_fit_quality': 3,
+            'optimizer': "MINUIT",
+            'retries': 1000,
+            'max_iter': 1000
+        }})
+    return gta
+
+def setup_gta(directory,phase_bin,band=0):
+    phase_bin = phase_bin
+    match = re.search(r'{working_dir}(.*)', directory)
+    string = match[1] if match else None
 
-    # -------------------------
-    # SED EXPORT
-    # -------------------------
-    sed = gta.sed('{SRCNAME}', use_local_index=True)
+    gta = load_gta(directory, phase_bin, band)
+    if FIT_STRATEGY["strategy"] == "tiered":
+        fit_tier = fit_tiered(gta, phase_bin)
+    else:
+        fit_tier = fit_full(gta, phase_bin)
+    # Band fits write into their fileio outdir, band_<b>/
+    out_dir = directory if band == 0 else os.path.join(directory, f"band_{{band}}")
+    with open(os.path.join(out_dir, "fit_tier.txt"), "w") as f:
+        f.write(fit_tier + "\\n")
+
+    return gta, phase_sed(gta, out_dir, phase_bin), fit_tier
+
+def phase_sed(gta, directory, phase_bin):
+    if sed_wanted(gta.roi['{SRCNAME}']['ts']) and not SED_SETTINGS["defer"]:
+        return export_sed(gta, directory, phase_bin)
+    return pd.DataFrame(columns=SED_COLUMNS)
+
+
+# -------------------------
+# JOINT FIT
+# All phase bins share one background model. The summed -logL is maximised by
+# alternating a fit of the shared background parameters, with every phase's
+# target held fixed, and target-only fits per phase with the background fixed.
+# -------------------------
+def shared_params(gta):
+    return [p for p in gta.get_params(freeonly=True) if p['src_name'] != '{SRCNAME}']
+
+def like_components(gta):
+    # Binned likelihoods of one phase; fermipy sums one per component
+    return getattr(gta.like, "components", [gta.like])
+
+def phase_loglike(gta, nparams):
+    # -logL and its analytic gradient in the free parameters (scaled values)
+    value, grad = 0.0, np.zeros(nparams)
+    for component in like_components(gta):
+        derivs = pyLike.DoubleVector()
+        component.logLike.getFreeDerivs(derivs)
+        if len(derivs) != nparams:
+            raise RuntimeError(f"{{len(derivs)}} free parameters, expected the {{nparams}} shared ones")
+        value -= component.logLike.value()
+        grad -= np.array(derivs)
+    return value, grad
+
+def fit_shared_background(gtas, params, x0):
+    # Only the shared parameters are free, in parameter-index order like
+    # getFreeDerivs, so each gradient entry lines up with params
+    bounds = [(p['min'], p['max']) for p in params]
+    for gta in gtas:
+        free_background(gta)
+
+    def summed_loglike(x):
+        value, grad = 0.0, np.zeros(len(params))
+        for gta in gtas:
+            for p, par_value in zip(params, x):
+                gta.set_parameter(p['src_name'], p['par_name'], par_value,
+                                  true_value=False, update_source=False)
+            phase_value, phase_grad = phase_loglike(gta, len(params))
+            value += phase_value
+            grad += phase_grad
+        return value, grad
+
+    with measure("joint_background", "joint"):
+        result = minimize(summed_loglike, x0, jac=True, method="L-BFGS-B", bounds=bounds)
+    value, _ = summed_loglike(result.x)
+    return result.x, value
+
+def fit_targets(gtas, phase_bins):
+    tier = "fast" if FIT_STRATEGY["strategy"] == "tiered" else "full"
+    for gta, phase_bin in zip(gtas, phase_bins):
+        gta.free_sources(free=False)
+        gta.free_source('{SRCNAME}', free=True)
+        with measure("joint_target", phase_bin):
+            gta.fit(**FIT_STRATEGY.get(tier, {{}}))
+
+def free_background(gta):
+    gta.free_sources(free=False)
+    gta.free_sources(distance=JOINT_FIT["background_radius"], pars='norm', exclude=['{SRCNAME}'])
+    for name in ('galdiff', 'isodiff'):
+        if name in gta.roi:
+            gta.free_source(name, pars='norm')
+
+def analyze_phases_joint():
+    phase_bins, gtas = [], []
+    for phase_bin, phase_dir in phase_directories():
+        print(f"--- Loading phase bin {{phase_bin}} ---")
+        gta = load_gta(phase_dir, phase_bin)
+        with measure("optimize", phase_bin):
+            gta.optimize()
+        phase_bins.append(phase_bin)
+        gtas.append(gta)
+
+    # Every phase starts from the first phase's background
+    free_background(gtas[0])
+    params = sorted(shared_params(gtas[0]), key=lambda p: p['idx'])
+    x = np.array([p['value'] for p in params])
+    for gta in gtas[1:]:
+        for p in params:
+            gta.set_parameter(p['src_name'], p['par_name'], p['value'],
+                              true_value=False, update_source=False)
+
+    fit_targets(gtas, phase_bins)
+    last = np.inf
+    for iteration in range(JOINT_FIT["max_iter"]):
+        x, current = fit_shared_background(gtas, params, x)
+        fit_targets(gtas, phase_bins)
+        print(f"Joint iteration {{iteration}}: -logL = {{current:.3f}}")
+        if last - current < JOINT_FIT["tol"]:
+            break
+        last = current
+
+    records, seds = [], []
+    for gta, phase_bin in zip(gtas, phase_bins):
+        phase_dir = os.path.join('{working_dir}', str(phase_bin))
+        os.chdir(phase_dir)
+        gta.write_roi('spectral_pars', make_plots=True)
+        with open("fit_tier.txt", "w") as f:
+            f.write("joint\\n")
+        records.append(phase_record(gta, '{SRCNAME}', phase_bin, "joint"))
+        seds.append(phase_sed(gta, phase_dir, phase_bin).assign(phase_bin=phase_bin, source='{SRCNAME}', band=0))
+        if not (SED_SETTINGS["defer"] and sed_wanted(records[-1]["ts"])):
+            retire_intermediates(phase_dir)
+
+    reset_results_store(RESULTS_STORE)
+    upsert_results_store(RESULTS_STORE, records, pd.concat(seds, ignore_index=True))
+    return records
+
+
+# -------------------------
+# SED EXPORT
+# Gated on the phase TS; with SED_SETTINGS["defer"] the SEDs are left to a
+# follow-up `python analyze_phases.py --sed-only` run on the saved ROIs
+# -------------------------
+SED_KEYS = ["e_ref", "e_min", "e_max", "e2dnde", "e2dnde_err", "e2dnde_err_lo",
+            "e2dnde_err_hi", "e2dnde_ul95", "ts"]
+_SED_GTA = None
+
+def sed_wanted(ts):
+    return SED_SETTINGS["min_ts"] is None or ts >= SED_SETTINGS["min_ts"]
+
+def _sed_bin(loge_bins):
+    # Runs in a forked worker that inherited the fitted GTA
+    sed = _SED_GTA.sed('{SRCNAME}', loge_bins=loge_bins, use_local_index=True,
+                       make_plots=False, write_fits=False, write_npy=False)
+    return {{key: np.atleast_1d(sed[key]) for key in SED_KEYS}}
+
+def compute_sed(gta):
+    global _SED_GTA
+    loge = gta.log_energies
+    workers = min(SED_SETTINGS["workers"], len(loge) - 1)
+    if workers <= 1:
+        return gta.sed('{SRCNAME}', use_local_index=True)
+    # Each energy bin is an independent fit of the target normalization
+    _SED_GTA = gta
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        parts = pool.map(_sed_bin, [[loge[i], loge[i + 1]] for i in range(len(loge) - 1)])
+    _SED_GTA = None
+    return {{key: np.concatenate([part[key] for part in parts]) for key in SED_KEYS}}
+
+def export_sed(gta, directory, phase_bin):
+    with measure("sed", phase_bin):
+        sed = compute_sed(gta)
     TS_THRESH = 4
     MeV_erg = 1.60218e-6
 
@@ -1084,14 +4195,10 @@ def setup_gta(directory,phase_bin):
             }})
 
     df.to_csv(os.path.join(directory, f"{SRCNAME}_{{phase_bin}}_sed.csv"), index=False)
+    return df
 
 
-
-    return gta
-
-
-def analyze_phases():
-    gta_list = []
+def phase_directories():
     base_dir = '{working_dir}'
 
     for d in sorted(os.listdir(base_dir), key=lambda x: int(x) if x.isdigit() else 1e9):
@@ -1100,83 +4207,107 @@ def analyze_phases():
         # only keep numeric directories (phase bins) just updated this....
         if not os.path.isdir(phase_dir) or not d.isdigit():
             continue
+        yield int(d), phase_dir
+
 
-        phase_bin = int(d)
+def analyze_phases(phases=None):
+    # Each phase lands in the store as soon as it is fitted, so the light
+    # curve fills in while the run progresses and a rerun touches only its rows
+    records = []
+    if phases is None:
+        reset_results_store(RESULTS_STORE)
+
+    for phase_bin, phase_dir in phase_directories():
+        if phases is not None and phase_bin not in phases:
+            continue
         print(f"--- Running phase bin {{phase_bin}} ---") # end update
+        phase_records, seds = [], []
+
+        # Band 0 is the full energy range; every band reuses this phase's reduction
+        band_dirs = [phase_dir] + [os.path.join(phase_dir, f"band_{{b}}") for b in range(1, len(ENERGY_BANDS) + 1)]
+        for band in range(len(band_dirs)):
+            gta, sed, fit_tier = setup_gta(phase_dir, phase_bin, band)
+            phase_records.append(phase_record(gta, '{SRCNAME}', phase_bin, fit_tier, band))
+            seds.append(sed.assign(phase_bin=phase_bin, source='{SRCNAME}', band=band))
+        # The follow-up SED run needs the ROI inputs of its phases
+        if not (SED_SETTINGS["defer"] and any(sed_wanted(r["ts"]) for r in phase_records)):
+            for directory in band_dirs:
+                retire_intermediates(directory)
+
+        upsert_results_store(RESULTS_STORE, phase_records, pd.concat(seds, ignore_index=True))
+        refresh_summary()
+        records += phase_records
+    return records
+
+
+def refresh_summary():
+    # A failed plot must not stop the remaining phases
+    try:
+        load_data_and_plot()
+    except Exception as e:
+        print(f"Light-curve refresh failed: {{e}}")
 
-        gta = setup_gta(phase_dir, phase_bin)
-        gta_list.append(gta)
 
-    return gta_list
+def sed_followup():
+    # Computes the deferred SEDs from each phase's spectral_pars ROI
+    store = read_results_store(RESULTS_STORE)
+    sel = store["source"] == '{SRCNAME}'
+    seds = []
+    for phase_bin, band, ts in zip(store["phase_bin"][sel], store["band"][sel], store["ts"][sel]):
+        if not sed_wanted(ts):
+            continue
+        phase_dir = os.path.join('{working_dir}', str(phase_bin))
+        out_dir = phase_dir if band == 0 else os.path.join(phase_dir, f"band_{{band}}")
+        print(f"--- SED for phase bin {{phase_bin}}, band {{band}} ---")
+        os.chdir(phase_dir)
+        with measure("fermipy_setup", phase_bin):
+            gta = GTAnalysis(band_config(band), logging={{'verbosity': 3}})
+            gta.setup()
+            gta.load_roi('spectral_pars')
+        sed = export_sed(gta, out_dir, phase_bin)
+        seds.append(sed.assign(phase_bin=phase_bin, source='{SRCNAME}', band=band))
+        retire_intermediates(out_dir)
+    if seds:
+        replace_store_seds(RESULTS_STORE, pd.concat(seds, ignore_index=True))
+
+
+def write_band_fluxes(store, num_bins):
+    # fluxes_band_<b>.csv per energy band, in the fluxes.csv layout
+    for band, (emin, emax) in enumerate(ENERGY_BANDS, 1):
+        sel = (store["source"] == '{SRCNAME}') & (store["band"] == band)
+        order = np.argsort(store["phase_bin"][sel])
+        df = pd.DataFrame({{
+            "phase": (store["phase_bin"][sel][order] - 1) / num_bins,
+            "phase_hw": 1.0 / (2*num_bins),
+            "flux": store["flux"][sel][order],
+            "flux_err": store["flux_err"][sel][order],
+            "ts": store["ts"][sel][order],
+            "emin": emin,
+            "emax": emax,
+            }})
+        for i in range(MAX_PARS):
+            df[f"par_{{i}}"] = store["par_values"][sel][order][:, i]
+            df[f"par_{{i}}_err"] = store["par_errors"][sel][order][:, i]
+        df.to_csv(os.path.join('{working_dir}', f'fluxes_band_{{band}}.csv'), index=False)
 
 
 def load_data_and_plot():
-    fluxes, flux_err, ts = [], [], []
     num_bins = {phase_bins}
-    spec_params = np.zeros((num_bins, 5))
-    spec_errs = np.zeros((num_bins, 5))
-
-    for i in range(num_bins):
-        p = np.load(
-            f'{working_dir}/{{i + 1}}/spectral_pars.npy',
-            allow_pickle=True
-        ).flat[0]
-
-        src = p['sources']['{SRCNAME}']
-        srctype = src['SpectrumType']
-
-        fluxes.append(src['flux'])
-        flux_err.append(src['flux_err'])
-        ts.append(src['ts'])
-
-        pars = src['spectral_pars']
-
-        # -------------------------------
-        # POWER LAW
-        # -------------------------------
-        if srctype == "PowerLaw":
-            spec_params[i, 0] = pars['Prefactor']['value']
-            spec_params[i, 1] = pars['Index']['value']
-
-            spec_errs[i, 0] = pars['Prefactor']['error']
-            spec_errs[i, 1] = pars['Index']['error']
-
-        # -------------------------------
-        # LOG PARABOLA
-        # -------------------------------
-        elif srctype == "LogParabola":
-            spec_params[i, 0] = pars['norm']['value']
-            spec_params[i, 1] = pars['alpha']['value']
-            spec_params[i, 2] = pars['beta']['value']
-            spec_params[i, 3] = pars['Eb']['value']
-
-            spec_errs[i, 0] = pars['norm']['error']
-            spec_errs[i, 1] = pars['alpha']['error']
-            spec_errs[i, 2] = pars['beta']['error']
-            spec_errs[i, 3] = pars['Eb']['error']
-
-        # -------------------------------
-        # PLEC4
-        # -------------------------------
-        elif srctype == "PLSuperExpCutoff4":
-            spec_params[i, 0] = pars['Prefactor']['value']
-            spec_params[i, 1] = pars['Index']['value']
-            spec_params[i, 2] = pars['Expfactor']['value']
-            spec_params[i, 3] = pars['ExpfactorS']['value']
-            spec_params[i, 4] = pars['S']['value']
-
-            spec_errs[i, 0] = pars['Prefactor']['error']
-            spec_errs[i, 1] = pars['Index']['error']
-            spec_errs[i, 2] = pars['Expfactor']['error']
-            spec_errs[i, 3] = pars['ExpfactorS']['error']
-            spec_errs[i, 4] = pars['S']['error']
+    store = read_results_store(RESULTS_STORE)
+    write_band_fluxes(store, num_bins)
+    sel = (store["source"] == '{SRCNAME}') & (store["band"] == 0)
+    order = np.argsort(store["phase_bin"][sel])
 
-        else:
-            raise ValueError(f"Unknown SpectrumType")
+    phase_bin = store["phase_bin"][sel][order]
+    fluxes = store["flux"][sel][order]
+    flux_err = store["flux_err"][sel][order]
+    ts = store["ts"][sel][order]
+    spec_params = store["par_values"][sel][order]
+    spec_errs = store["par_errors"][sel][order]
 
 
 
-    phase = np.arange(0, 1, 1 / num_bins)
+    phase = (phase_bin - 1) / num_bins
     phase = np.append(phase, phase + 1)
 
     fluxes = np.append(fluxes, fluxes)
@@ -1230,7 +4361,9 @@ def load_data_and_plot():
     ax3.set_xticks([])
     plt.xlabel("Phase", fontsize=28)
     plt.tight_layout()
-    plt.savefig('{working_dir}/{SRCNAME}_phase_folded_lc.png')
+    fig.savefig('{working_dir}/{SRCNAME}_phase_folded_lc.png')
+    # Redrawn after every phase, so the figure must not accumulate
+    plt.close(fig)
 
 
     df = pd.DataFrame({{
@@ -1242,9 +4375,9 @@ def load_data_and_plot():
         }})
 
     for i in range(5):
-        df[f"par_{i}"] = spec_params[:, i]
-        df[f"par_{i}_err"] = spec_errs[:, i]
-    df.to_csv('fluxes.csv', index=False)
+        df[f"par_{{i}}"] = spec_params[:, i]
+        df[f"par_{{i}}_err"] = spec_errs[:, i]
+    df.to_csv(os.path.join('{working_dir}', 'fluxes.csv'), index=False)
 
 
 
@@ -1252,9 +4385,23 @@ def load_data_and_plot():
     return spec_params, spec_errs, phase, fluxes, flux_err, ts
 
 if __name__ == "__main__":
-
-        analyze_phases()
-        pars, errs, phase, fluxes, flux_err, ts = load_data_and_plot()
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--sed-only", action="store_true",
+                            help="compute deferred SEDs from the saved phase ROIs")
+        parser.add_argument("--phases", type=lambda text: {{int(p) for p in text.split(",") if p.strip()}},
+                            help="comma-separated phase bins to (re)analyze; the others keep their stored results")
+        args = parser.parse_args()
+        if args.phases and JOINT_FIT["enabled"]:
+            parser.error("--phases cannot be used with the joint fit, which refits every phase "
+                         "against one shared background")
+
+        if args.sed_only:
+            sed_followup()
+        elif JOINT_FIT["enabled"]:
+            analyze_phases_joint()
+            pars, errs, phase, fluxes, flux_err, ts = load_data_and_plot()
+        else:
+            analyze_phases(args.phases)
 
 """
         script_path = os.path.join(local_dir, "analyze_phases.py")
@@ -1263,10 +4410,32 @@ if __name__ == "__main__":
         self.status_text.append(f"Analysis script written: {script_path}")
 
 
+def startup_benchmark(app, window, t_imports, t_config, t_window):
+    """Prints where startup time went, then quits once the window is painted."""
+    app.processEvents()
+    t_shown = time.perf_counter()
+    lazy = {"numpy": np, "yaml": yaml, "paramiko": paramiko, "scp": SCPClient.lazy_module,
+            "tqdm": tqdm.lazy_module, "pandas": pd, "astropy.io.fits": fits,
+            "astropy.wcs": WCS.lazy_module}
+    print(f"imports        {1000 * (t_imports - _STARTUP_T0):8.1f} ms")
+    print(f"setup.yaml     {1000 * (t_config - t_imports):8.1f} ms")
+    print(f"Qt + window    {1000 * (t_window - t_config):8.1f} ms")
+    print(f"first paint    {1000 * (t_shown - t_window):8.1f} ms")
+    print(f"total          {1000 * (t_shown - _STARTUP_T0):8.1f} ms")
+    print("loaded lazily: " + (", ".join(name for name, m in lazy.items() if m.loaded) or "none"))
+    window.close()
+
+
 # Run the app
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    benchmark = "--startup-benchmark" in sys.argv
+    t_imports = time.perf_counter()
     config = load_config()   # ← load once here
+    t_config = time.perf_counter()
+    app = QApplication(sys.argv)
     window = FermiScriptGenerator(config)
     window.show()
+    if benchmark:
+        startup_benchmark(app, window, t_imports, t_config, time.perf_counter())
+        sys.exit(0)
     sys.exit(app.exec_())
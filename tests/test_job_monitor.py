@@ -0,0 +1,129 @@
+"""JobMonitor against the stand-in sacct/squeue in tests/fake_slurm."""
+import asyncio
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import FermiPhased
+
+FAKE_SLURM_BIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_slurm")
+
+
+@pytest.fixture
+def slurm(tmp_path, monkeypatch):
+    """Puts the stand-in scheduler first on PATH; returns a job-state setter."""
+    states = tmp_path / "slurm"
+    states.mkdir()
+    monkeypatch.setenv("FAKE_SLURM", str(states))
+    monkeypatch.setenv("PATH", FAKE_SLURM_BIN + os.pathsep + os.environ["PATH"])
+
+    def set_state(**jobs):
+        for job, state in jobs.items():
+            (states / job.lstrip("j")).write_text(state + "\n")
+    return set_state
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    path = tmp_path / "run"
+    path.mkdir()
+    return path
+
+
+def monitor_for(run_dir, phase_bins, messages):
+    return FermiPhased.JobMonitor(FermiPhased.local_runner, str(run_dir), [101, 102], phase_bins,
+                                  phase_bins, messages.append, poll_interval=0)
+
+
+def poll(monitor, messages):
+    messages.clear()
+    asyncio.run(monitor.poll())
+    return list(messages)
+
+
+def test_batches_queued_running_then_failed(slurm, run_dir):
+    messages = []
+    monitor = monitor_for(run_dir, 4, messages)
+
+    slurm(j101="PENDING", j102="PENDING")
+    assert poll(monitor, messages) == ["Job 101: SUBMITTED → PENDING", "Job 102: SUBMITTED → PENDING"]
+    assert not monitor.finished()
+
+    slurm(j101="RUNNING")
+    (run_dir / "done_1.flag").touch()
+    assert poll(monitor, messages) == ["Job 101: PENDING → RUNNING", "Phase flags: 1/4"]
+
+    slurm(j101="COMPLETED", j102="RUNNING")
+    (run_dir / "done_2.flag").touch()
+    (run_dir / "failed_3.flag").write_text("gtselect 1\n")
+    assert poll(monitor, messages) == [
+        "Job 101: RUNNING → COMPLETED",
+        "Job 102: PENDING → RUNNING",
+        "Phase flags: 2/4",
+        "⚠️ Phase 3 failed in gtselect (exit 1)",
+    ]
+    assert monitor.failed == {3: ("gtselect", 1)}
+    assert not monitor.finished()
+
+    # Nothing changed, so nothing is reported
+    assert poll(monitor, messages) == []
+
+    # With a phase missing no analysis job is submitted, so the run is over
+    # as soon as the last batch ends
+    slurm(j102="TIMEOUT")
+    assert poll(monitor, messages) == ["Job 102: RUNNING → TIMEOUT"]
+    assert monitor.finished()
+
+
+def test_analysis_job_followed_until_done(slurm, run_dir):
+    messages = []
+    monitor = monitor_for(run_dir, 2, messages)
+
+    slurm(j101="COMPLETED", j102="COMPLETED", j200="PENDING")
+    for phase in (1, 2):
+        (run_dir / f"done_{phase}.flag").touch()
+    (run_dir / "analysis_job.id").write_text("200\n")
+    assert poll(monitor, messages) == [
+        "Job 101: SUBMITTED → COMPLETED",
+        "Job 102: SUBMITTED → COMPLETED",
+        "Phase flags: 2/2",
+        "Analysis job 200 submitted",
+        "Analysis job 200: SUBMITTED → PENDING",
+    ]
+    # Every batch is done, but the analysis job still has to run
+    assert not monitor.finished()
+
+    slurm(j200="RUNNING")
+    (run_dir / "1").mkdir()
+    (run_dir / "1" / "spectral_pars.npy").touch()
+    assert poll(monitor, messages) == ["Phase 1 results ready", "Analysis job 200: PENDING → RUNNING"]
+    assert not monitor.finished()
+
+    slurm(j200="COMPLETED")
+    assert poll(monitor, messages) == ["Analysis job 200: RUNNING → COMPLETED"]
+    assert monitor.finished()
+
+
+def test_run_reports_abnormal_endings(slurm, run_dir):
+    messages = []
+    monitor = monitor_for(run_dir, 2, messages)
+    slurm(j101="COMPLETED", j102="FAILED")
+    (run_dir / "done_1.flag").touch()
+    (run_dir / "failed_2.flag").write_text("gtltcube 137\n")
+
+    asyncio.run(monitor.run())
+
+    assert messages == [
+        f"Monitoring 2 jobs in {run_dir}",
+        "Job 101: SUBMITTED → COMPLETED",
+        "Job 102: SUBMITTED → FAILED",
+        "Phase flags: 1/2",
+        "⚠️ Phase 2 failed in gtltcube (exit 137)",
+        "⚠️ Jobs ended abnormally: 102",
+        "Monitor finished: 1/2 flags, 0/2 phases analysed",
+        "⚠️ Some phases did not finish; use Resubmit Failed Phases to rerun them.",
+    ]
@@ -0,0 +1,96 @@
+"""Results-store upserts of the generated analyze_phases.py."""
+import importlib
+import os
+import sys
+import types
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import FermiPhased
+
+SRCNAME = "PSR_TEST"
+# The script imports these at module level; fermipy and pyLikelihood exist only
+# on the cluster, so a stand-in is used wherever the real module is missing
+CLUSTER_MODULES = {
+    "scipy": {}, "scipy.optimize": {"minimize": None},
+    "matplotlib": {},
+    "matplotlib.pyplot": {"subplots": lambda *args, **kwargs: (mock.MagicMock(), [mock.MagicMock()] * 4),
+                          "xlabel": mock.MagicMock(), "tight_layout": mock.MagicMock(), "close": mock.MagicMock()},
+    "pyLikelihood": {}, "fermipy": {}, "fermipy.gtanalysis": {"GTAnalysis": None},
+}
+
+
+@pytest.fixture
+def analysis(tmp_path, monkeypatch):
+    """Renders analyze_phases.py into tmp_path and returns its namespace."""
+    for name, attrs in CLUSTER_MODULES.items():
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            monkeypatch.setitem(sys.modules, name, types.SimpleNamespace(**attrs))
+    window = types.SimpleNamespace(status_text=types.SimpleNamespace(append=lambda text: None))
+    FermiPhased.FermiScriptGenerator.generate_analysis_script(
+        window, 0, str(tmp_path), str(tmp_path), 3, SRCNAME, "")
+    path = tmp_path / "analyze_phases.py"
+    namespace = {"__name__": "analyze_phases"}
+    exec(compile(path.read_text(), str(path), "exec"), namespace)
+    return namespace
+
+
+def record(phase, flux):
+    return dict(phase_bin=phase, source=SRCNAME, spectrum_type="PowerLaw", flux=flux, flux_err=0.1,
+                ts=25.0, par_values=np.full(5, flux), par_errors=np.zeros(5), par_names=["p"] * 5,
+                fit_tier="full", band=0)
+
+
+def sed(analysis, phase, ts):
+    return pd.DataFrame({column: [ts] for column in analysis["SED_COLUMNS"]}).assign(
+        UL=False, phase_bin=phase, source=SRCNAME, band=0)
+
+
+def rows(store, phase):
+    return {key: column[store["phase_bin"] == phase].tolist()
+            for key, column in store.items() if not key.startswith("sed_")}
+
+
+def test_upsert_replaces_only_the_given_phase(analysis):
+    path = analysis["RESULTS_STORE"]
+    for phase in (1, 2, 3):
+        analysis["upsert_results_store"](path, [record(phase, float(phase))], sed(analysis, phase, float(phase)))
+    before = analysis["read_results_store"](path)
+
+    analysis["upsert_results_store"](path, [record(2, 20.0)], sed(analysis, 2, 9.0))
+    after = analysis["read_results_store"](path)
+
+    assert sorted(after["phase_bin"]) == [1, 2, 3]
+    for phase in (1, 3):
+        assert rows(after, phase) == rows(before, phase)
+        kept = before["sed_phase_bin"] == phase
+        assert after["sed_ts"][after["sed_phase_bin"] == phase].tolist() == before["sed_ts"][kept].tolist()
+    assert rows(after, 2)["flux"] == [20.0]
+    assert after["sed_ts"][after["sed_phase_bin"] == 2].tolist() == [9.0]
+
+
+def test_reset_drops_the_store(analysis):
+    path = analysis["RESULTS_STORE"]
+    analysis["upsert_results_store"](path, [record(1, 1.0)], sed(analysis, 1, 1.0))
+    analysis["reset_results_store"](path)
+    assert not os.path.exists(path)
+
+
+def test_fluxes_table_has_every_spectral_parameter(analysis, tmp_path):
+    path = analysis["RESULTS_STORE"]
+    for phase in (1, 2, 3):
+        analysis["upsert_results_store"](path, [record(phase, float(phase))], sed(analysis, phase, float(phase)))
+    analysis["load_data_and_plot"]()
+
+    table = pd.read_csv(tmp_path / "fluxes.csv")
+    for i in range(5):
+        assert table[f"par_{i}"].tolist() == [1.0, 2.0, 3.0] * 2
+        assert table[f"par_{i}_err"].tolist() == [0.0] * 6